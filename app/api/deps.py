@@ -1,29 +1,38 @@
-from fastapi import Depends, HTTPException, status, WebSocket
+from fastapi import Depends, Header, HTTPException, status, WebSocket
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-import chromadb
+from motor.motor_asyncio import AsyncIOMotorDatabase
+import hmac
 from typing import Optional
 
+from app.core import auth_cache, database
 from app.core.config import settings
 from app.crud import user as crud_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-mongo_client = AsyncIOMotorClient(settings.MONGODB_URL)
-db = mongo_client[settings.DB_NAME]
 
-chroma_client = chromadb.HttpClient(
-    host=settings.CHROMA_HOST, port=settings.CHROMA_PORT
-)
+async def get_db() -> AsyncIOMotorDatabase:
+    return database.get_database()
 
 
-async def get_db() -> AsyncIOMotorDatabase:
-    return db
+# Disponível também como dependência dos endpoints.
+get_chroma_client = database.get_chroma_client
 
 
-def get_chroma_client() -> chromadb.Client:
-    return chroma_client
+async def resolve_user(db: AsyncIOMotorDatabase, token: str) -> Optional[dict]:
+    """Resolve o usuário do token, usando os caches de tokens e de usuários."""
+    email = auth_cache.decode_token_subject(token)
+    if email is None:
+        return None
+
+    user = auth_cache.user_cache.get(email)
+    if user is None:
+        generation = auth_cache.generation()
+        user = await crud_user.get_user_by_email(db, email=email)
+        if user is None:
+            return None
+        auth_cache.cache_user(email, user, generation)
+    return user
 
 
 async def get_current_user(
@@ -34,17 +43,7 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = await crud_user.get_user_by_email(db, email=email)
+    user = await resolve_user(db, token)
     if user is None:
         raise credentials_exception
     return user
@@ -60,18 +59,19 @@ async def get_current_user_ws(
     token: Optional[str] = websocket.query_params.get("token")
     if token is None:
         return None
+    return await resolve_user(db, token)
 
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-    except JWTError:
-        return None
 
-    user = await crud_user.get_user_by_email(db, email=email)
-    if user is None:
-        return None
-    return user
+async def require_metrics_access(x_metrics_token: Optional[str] = Header(None)):
+    """
+    Endpoints de diagnóstico interno: só existem com METRICS_TOKEN configurado
+    e exigem o token no header `X-Metrics-Token`.
+    """
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_metrics_token or not hmac.compare_digest(
+        x_metrics_token.encode("utf-8"), settings.METRICS_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid metrics token"
+        )
@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api import deps
-from app.core.security import create_access_token, verify_password
+from app.core.executors import ExecutorBusyError, ExecutorTimeoutError
+from app.core.security import create_access_token, verify_and_update_password_async
 from app.crud import user as crud_user
 from app.schemas.user import UserCreate
 
@@ -37,13 +38,28 @@ async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
 ):
     db_user = await crud_user.get_user_by_email(db, email=form_data.username)
-    if not db_user or not verify_password(
-        form_data.password, db_user["hashed_password"]
-    ):
+    verified, new_hash = False, None
+    if db_user:
+        try:
+            verified, new_hash = await verify_and_update_password_async(
+                form_data.password, db_user["hashed_password"]
+            )
+        except (ExecutorBusyError, ExecutorTimeoutError):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # O hash foi gerado com outro custo do bcrypt: grava o novo.
+        await crud_user.update_password_hash(
+            db, db_user["_id"], db_user["hashed_password"], new_hash
+        )
     access_token = create_access_token(subject=db_user["email"])
     return {"access_token": access_token, "token_type": "bearer"}
@@ -1,7 +1,4 @@
-import json
 import asyncio
-import re
-import random
 from datetime import datetime
 from bson import ObjectId
 
@@ -9,6 +6,7 @@ from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Query,
     status,
     WebSocket,
     WebSocketDisconnect,
@@ -18,9 +16,21 @@ from typing import List, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.api import deps
+from app.core import combat
+from app.core.config import settings
+from app.core.free_llms import LLM_FAILURE_MESSAGE
+from app.core.log_util import log_exception
 from app.crud import character as crud_character
 from app.crud import battle as crud_battle
-from app.services import llm_service
+from app.services import llm_service, prompt_budget
+from app.services.battle_session import (
+    BattleSession,
+    has_live_session,
+    load_session,
+)
+from app.services.memory_compaction import discard_battle_memories
+from app.services.prompt_budget import format_history
+from app.services.pacing import NarrativePacer, resolve_pacing_mode
 from app.api.v1.endpoints.characters import character_helper
 
 router = APIRouter()
@@ -47,13 +57,19 @@ class ActionPayload(BaseModel):
     character_id: str
     battle_theme: str
     action: str
-    history: List[str]
+    # Com battle_id o histórico vem do estado salvo; o enviado pelo cliente é
+    # usado apenas em batalhas sem estado no servidor.
+    history: Optional[List[str]] = None
+    battle_id: Optional[str] = None
 
 
 class SuggestionsPayload(BaseModel):
     character_id: str
     battle_theme: str
     history: List[str]
+    # Quando informados, reaproveita a sugestão calculada pelo WebSocket
+    battle_id: Optional[str] = None
+    turn_index: Optional[int] = None
 
 
 class BattleStatePayload(BaseModel):
@@ -66,21 +82,20 @@ class BattleStatePayload(BaseModel):
     last_updated: str
 
 
-def parse_llm_response(response_str: str):
-    narrative = response_str
-    event = {"tipo": "dialogo", "danoRecebido": 0, "danoCausado": 0, "vitoria": False}
+def narration_failed(narrative: str) -> bool:
+    """Sem narrativa a rodada não conta: o resultado não é aplicado nem gravado."""
+    return not narrative or narrative == LLM_FAILURE_MESSAGE
+
 
-    match = re.search(r"\[DANO_CAUSADO:(\d+),DANO_RECEBIDO:(\d+)\]", response_str)
-    if match:
-        narrative = response_str.split("[")[0].strip()
-        event = {
-            "tipo": "combate",
-            "danoCausado": int(match.group(1)),
-            "danoRecebido": int(match.group(2)),
-            "vitoria": False,  
-        }
+def round_event(outcome: combat.RoundOutcome) -> Dict[str, Any]:
+    """Evento da rodada enviado ao cliente, a partir do resultado do motor."""
+    return {
+        "tipo": "combate",
+        "danoCausado": outcome.player_damage,
+        "danoRecebido": outcome.enemy_damage,
+        "vitoria": False,
+    }
 
-    return narrative, event
 
 @router.post("/start_battle", summary="Inicia uma nova batalha com IA")
 async def start_battle(
@@ -93,16 +108,13 @@ async def start_battle(
         raise HTTPException(status_code=404, detail="Personagem não encontrado.")
 
     char = character_helper(char_from_db)
+    llm_service.schedule_hot_memory_load(payload.character_id)
 
-    memory = llm_service.retrieve_memory(
-        character_id=payload.character_id, query=payload.battle_theme
+    narrative = await llm_service.get_opening_narrative(
+        char, payload.character_id, payload.battle_theme
     )
 
-    narrative = await llm_service.generate_initial_narrative(
-        char, payload.battle_theme, memory
-    )
-
-    llm_service.save_interaction(
+    await llm_service.save_interaction_async(
         payload.character_id,
         f"Narrador (Início da Batalha: {payload.battle_theme}): {narrative}",
     )
@@ -129,19 +141,95 @@ async def take_action(
 
     char = character_helper(char_from_db)
 
-    context_query = f"Tema: {payload.battle_theme}. Ação do jogador: {payload.action}"
-    memory = llm_service.retrieve_memory(
+    battle_theme = payload.battle_theme
+    history, history_summary, window_start = payload.history or [], "", 0
+    battle_state = None
+    if payload.battle_id:
+        battle_state = await crud_battle.get_battle_state_by_character_and_user(
+            db,
+            payload.character_id,
+            payload.battle_id,
+            str(current_user["_id"]),
+            history_tail=settings.BATTLE_HISTORY_TAIL,
+        )
+        if battle_state:
+            if battle_state.get("status") == crud_battle.FINISHED_STATUS:
+                raise HTTPException(status_code=409, detail="Batalha já concluída.")
+            # A sessão do websocket tem turnos ainda não gravados: os dois
+            # caminhos sorteariam a mesma rodada.
+            if has_live_session(payload.character_id, payload.battle_id):
+                raise HTTPException(
+                    status_code=409, detail="Batalha em andamento em outra conexão."
+                )
+            battle_theme = battle_state.get("battle_theme", battle_theme)
+            history_summary, history, window_start = prompt_budget.history_window(
+                battle_state
+            )
+
+    context_query = f"Tema: {battle_theme}. Ação do jogador: {payload.action}"
+    memory = await llm_service.retrieve_memory_async(
         character_id=payload.character_id, query=context_query
     )
 
+    # Só batalhas com estado no servidor têm rodadas reprodutíveis
+    rng = combat.round_rng(
+        payload.character_id,
+        payload.battle_id if battle_state else None,
+        battle_state["history_length"] if battle_state else 0,
+        settings.SECRET_KEY,
+    )
+    outcome = combat.resolve_round(char["attributes"], payload.action, rng)
     response_str = await llm_service.continue_narrative(
-        char, payload.battle_theme, payload.history, payload.action, memory
+        char, battle_theme, history, payload.action, memory, outcome, history_summary
     )
 
-    narrative, event = parse_llm_response(response_str)
+    narrative, event = response_str.strip(), round_event(outcome)
+    if narration_failed(narrative):
+        return {"narrativa": narrative or LLM_FAILURE_MESSAGE, "evento": {}}
+
+    # Grava o turno: a próxima rodada usa o novo tamanho do histórico na semente.
+    # Só grava se nenhum outro turno entrou desde a leitura (mesma semente).
+    if battle_state:
+        player_health = battle_state.get("player_health", 0) - outcome.enemy_damage
+        enemy_health = battle_state.get("enemy_health", 0) - outcome.player_damage
+        finished = player_health <= 0 or enemy_health <= 0
+        stored = await crud_battle.append_battle_turn(
+            db,
+            payload.character_id,
+            payload.battle_id,
+            [
+                {"speaker": char["name"], "text": payload.action},
+                {"speaker": "Narrador", "text": narrative},
+            ],
+            player_damage=outcome.enemy_damage,
+            enemy_damage=outcome.player_damage,
+            status=crud_battle.FINISHED_STATUS if finished else None,
+            expected_length=battle_state["history_length"],
+        )
+        if not stored:
+            raise HTTPException(
+                status_code=409, detail="A batalha mudou; envie a ação novamente."
+            )
+        event["vitoria"] = enemy_health <= 0
+
+        # Falas que saíram da janela do prompt entram no resumo acumulado
+        pending_summary = window_start - battle_state.get("summarized_until", 0)
+        if pending_summary >= settings.PROMPT_SUMMARY_MIN_ENTRIES:
+            llm_service.schedule_history_summary(
+                db, payload.character_id, payload.battle_id, battle_state, window_start
+            )
 
-    llm_service.save_interaction(payload.character_id, f"Jogador: {payload.action}")
-    llm_service.save_interaction(payload.character_id, f"Narrador: {narrative}")
+    # Com estado no servidor, as memórias entram na compactação da batalha
+    battle_id = payload.battle_id if battle_state else None
+    await llm_service.save_interaction_async(
+        payload.character_id,
+        f"Jogador: {payload.action}",
+        battle_id=battle_id,
+        kind=llm_service.MEMORY_KIND_PLAYER,
+    )
+    await llm_service.save_interaction_async(
+        payload.character_id, f"Narrador: {narrative}", battle_id=battle_id
+    )
 
     return {"narrativa": narrative, "evento": event}
 
@@ -149,28 +237,62 @@ async def take_action(
 @router.post("/suggestions", summary="Obtém sugestões de ação da LLM")
 async def get_action_suggestions(
     payload: SuggestionsPayload,
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
     current_user=Depends(deps.get_current_user),
 ):
     try:
-        suggestions_str = await llm_service.generate_action_suggestions(
+        if payload.battle_id is not None and payload.turn_index is not None:
+            # A sugestão especulativa vem do histórico salvo: só para o dono.
+            battle_state = await crud_battle.get_battle_state_by_character_and_user(
+                db,
+                payload.character_id,
+                payload.battle_id,
+                str(current_user["_id"]),
+                history_tail=0,
+            )
+            if battle_state:
+                suggestions = await llm_service.speculative_suggestions.get(
+                    payload.character_id, payload.battle_id, payload.turn_index
+                )
+                if suggestions:
+                    return {"suggestions": suggestions}
+
+        suggestions = await llm_service.suggest_actions(
             payload.battle_theme, payload.history
         )
-        # Usa regex para encontrar uma lista de sugestões separadas por '|' ou em formato de lista
-        match = re.search(r"([^\n]+)\|([^\n]+)\|([^\n]+)", suggestions_str)
-        if match:
-            suggestions = [
-                match.group(1).strip(),
-                match.group(2).strip(),
-                match.group(3).strip(),
-            ]
-        else:
-            suggestions = [s.strip() for s in suggestions_str.split("\n") if s.strip()][
-                :3
-            ]
-
         return {"suggestions": suggestions}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except Exception:
+        log_exception()
+        raise HTTPException(status_code=500, detail="Não foi possível gerar sugestões.")
+
+
+async def push_speculative_suggestions(
+    websocket: WebSocket,
+    character_id: str,
+    battle_id: str,
+    battle_theme: str,
+    history: List[Dict[str, str]],
+    turn_index: int,
+):
+    """
+    Calcula as sugestões do próximo turno em segundo plano e as envia ao
+    cliente num frame `suggestions` assim que ficarem prontas.
+    """
+    task = llm_service.speculative_suggestions.schedule(
+        character_id, battle_id, turn_index, battle_theme, format_history(history)
+    )
+    try:
+        suggestions = await asyncio.shield(task)
+        await websocket.send_json(
+            {
+                "type": "suggestions",
+                "payload": {"turn_index": turn_index, "suggestions": suggestions},
+            }
+        )
+    except (WebSocketDisconnect, RuntimeError, asyncio.CancelledError):
+        pass
+    except Exception:
+        log_exception()
 
 
 @router.websocket("/ws/battle/{character_id}/{battle_id}")
@@ -178,10 +300,33 @@ async def websocket_endpoint(
     websocket: WebSocket,
     character_id: str,
     battle_id: str,
+    pacing: Optional[str] = None,
+    theme: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(deps.get_db),
     current_user: Optional[dict] = Depends(deps.get_current_user_ws),
 ):
     await websocket.accept()
+    # Ritmo de envio da narrativa: "none", "server" ou "batched" (?pacing=...)
+    pacer = NarrativePacer(websocket, resolve_pacing_mode(pacing))
+    suggestion_tasks = set()
+
+    def speculate_suggestions(
+        battle_theme: str, history: List[Dict[str, str]], turn_index: int
+    ):
+        if not settings.SPECULATIVE_SUGGESTIONS_ENABLED:
+            return
+        task = asyncio.create_task(
+            push_speculative_suggestions(
+                websocket,
+                character_id,
+                battle_id,
+                battle_theme,
+                list(history),
+                turn_index,
+            )
+        )
+        suggestion_tasks.add(task)
+        task.add_done_callback(suggestion_tasks.discard)
 
     if not current_user:
         await websocket.close(
@@ -189,52 +334,66 @@ async def websocket_endpoint(
         )
         return
 
+    session: Optional[BattleSession] = None
     try:
-        battle_state_doc = await crud_battle.get_battle_state_by_character_and_user(
-            db, character_id, battle_id, str(current_user["_id"])
+        # Personagem e estado são lidos uma vez e ficam na sessão da conexão
+        char_from_db = await crud_character.get_character_by_id(db, character_id)
+        if not char_from_db or char_from_db.get("user_id") != str(
+            current_user.get("_id")
+        ):
+            await websocket.close(code=status.HTTP_404_NOT_FOUND)
+            return
+        character = character_helper(char_from_db)
+
+        session = await load_session(
+            db, character_id, battle_id, character, str(current_user["_id"])
         )
-        if battle_state_doc:
-            serialized_doc = serialize_object_id(battle_state_doc)
+        if session:
+            llm_service.schedule_hot_memory_load(character_id)
+            serialized_doc = serialize_object_id(session.state)
             await websocket.send_json({"type": "load_state", "payload": serialized_doc})
         else:
-            battle_theme = "Conflito na Nebulosa Primordial"
-            char_from_db = await crud_character.get_character_by_id(db, character_id)
-            if not char_from_db or char_from_db.get("user_id") != str(
-                current_user.get("_id")
-            ):
-                await websocket.close(code=status.HTTP_404_NOT_FOUND)
-                return
-
-            character = character_helper(char_from_db)
-            memory = llm_service.retrieve_memory(character_id, battle_theme)
-            narrative = await llm_service.generate_initial_narrative(
-                character, battle_theme, memory
+            battle_theme = theme or settings.DEFAULT_BATTLE_THEME
+            llm_service.schedule_hot_memory_load(character_id)
+            narrative = await llm_service.get_opening_narrative(
+                character, character_id, battle_theme
             )
 
             await websocket.send_json({"type": "narrative_start"})
-            await asyncio.sleep(0.5)
+            await pacer.pause(0.5)
             for line in narrative.split("\n"):
                 if line.strip():
-                    await websocket.send_json(
-                        {"type": "narrative_chunk", "payload": line + "\n"}
-                    )
-                    await asyncio.sleep(0.05)
+                    await pacer.send_chunk(line + "\n", delay=0.05)
+            await pacer.flush()
 
             initial_state = {
                 "character_id": character_id,
                 "battle_id": battle_id,
                 "battle_theme": battle_theme,
                 "history": [{"speaker": "Narrador", "text": narrative}],
-                "player_health": 200,
-                "enemy_health": 450,
+                "player_health": combat.PLAYER_START_HEALTH,
+                "enemy_health": combat.ENEMY_START_HEALTH,
                 "last_updated": datetime.utcnow().isoformat(),
             }
-            await crud_battle.save_battle_state(
-                db, {**initial_state, "user_id": str(current_user["_id"])}
+            initial_state["user_id"] = str(current_user["_id"])
+            await crud_battle.save_battle_state(db, dict(initial_state))
+            session = BattleSession(
+                db, character_id, battle_id, character, initial_state
             )
 
             await websocket.send_json(
-                {"type": "narrative_end", "payload": {"event": {}}}
+                {
+                    "type": "narrative_end",
+                    "payload": {
+                        "event": {},
+                        "turn_index": len(initial_state["history"]),
+                    },
+                }
+            )
+            speculate_suggestions(
+                battle_theme,
+                initial_state["history"],
+                len(initial_state["history"]),
             )
 
         while True:
@@ -242,84 +401,121 @@ async def websocket_endpoint(
 
             if message["type"] == "player_action":
                 player_action = message["payload"]["action"]
-                history = message["payload"]["history"]
 
-                char_from_db = await crud_character.get_character_by_id(
-                    db, character_id
-                )
-                if not char_from_db:
-                    await websocket.close(code=status.HTTP_404_NOT_FOUND)
-                    return
-                char = character_helper(char_from_db)
+                char = session.character
+                # O prompt usa o histórico da sessão, não o enviado pelo cliente
+                battle_state = session.state
+                history_summary, history, window_start = session.history_window()
 
-                current_state_doc = await crud_battle.get_battle_state(
-                    db, character_id, battle_id
+                context_query = (
+                    f"Tema: {session.battle_theme}. Ação do jogador: {player_action}"
                 )
-                if not current_state_doc:
-                    await websocket.close(code=status.HTTP_404_NOT_FOUND)
-                    return
-
-                context_query = f"Tema: {current_state_doc.get('battle_theme', '')}. Ação do jogador: {player_action}"
-                memory = llm_service.retrieve_memory(
+                memory = await llm_service.retrieve_memory_async(
                     character_id=character_id, query=context_query
                 )
 
-                response_str = await llm_service.continue_narrative(
-                    char,
-                    current_state_doc.get("battle_theme", ""),
-                    history,
+                # A rodada é resolvida pelo motor antes do prompt; a LLM só a narra
+                outcome = combat.resolve_round(
+                    char["attributes"],
                     player_action,
-                    memory,
+                    combat.round_rng(
+                        character_id,
+                        battle_id,
+                        battle_state["history_length"],
+                        settings.SECRET_KEY,
+                    ),
                 )
 
-                narrative, event = parse_llm_response(response_str)
+                # Avisa o frontend que uma nova resposta do narrador está começando
+                await websocket.send_json({"type": "narrator_turn_start"})
+                await pacer.pause(0.1)  # Um pequeno delay para garantir a ordem
 
-                llm_service.save_interaction(
-                    character_id, f"{char['name']}: {player_action}"
+                # Repassa o texto da LLM conforme chega
+                narrative_parts = []
+                async for token in llm_service.continue_narrative_stream(
+                    char,
+                    session.battle_theme,
+                    history,
+                    player_action,
+                    memory,
+                    outcome,
+                    history_summary,
+                ):
+                    if token:
+                        narrative_parts.append(token)
+                        await pacer.send_chunk(token)
+                await pacer.flush()
+
+                narrative = "".join(narrative_parts).strip()
+                if narration_failed(narrative):
+                    # O turno não avança: a mesma rodada é sorteada na nova tentativa
+                    await websocket.send_json(
+                        {
+                            "type": "narrative_end",
+                            "payload": {
+                                "event": {},
+                                "turn_index": battle_state["history_length"],
+                            },
+                        }
+                    )
+                    continue
+                event = round_event(outcome)
+
+                await llm_service.save_interaction_async(
+                    character_id,
+                    f"{char['name']}: {player_action}",
+                    battle_id=battle_id,
+                    kind=llm_service.MEMORY_KIND_PLAYER,
                 )
-                llm_service.save_interaction(character_id, f"Narrador: {narrative}")
-
-                updated_history = current_state_doc["history"]
-                updated_history.append({"speaker": char["name"], "text": player_action})
-                updated_history.append({"speaker": "Narrador", "text": narrative})
-
-                updated_state = {
-                    "history": updated_history,
-                    "player_health": current_state_doc["player_health"]
-                    - event.get("danoRecebido", 0),
-                    "enemy_health": current_state_doc["enemy_health"]
-                    - event.get("danoCausado", 0),
-                    "last_updated": datetime.utcnow().isoformat(),
-                }
-                if updated_state["enemy_health"] <= 0 or updated_state["player_health"] <= 0:
-                    event["vitoria"] = updated_state["enemy_health"] <= 0
-                    updated_state["status"] = "concluído"
-                
-                await crud_battle.save_battle_state(
-                    db, {**current_state_doc, **updated_state}
+                await llm_service.save_interaction_async(
+                    character_id, f"Narrador: {narrative}", battle_id=battle_id
                 )
 
-                # Avisa o frontend que uma nova resposta do narrador está começando
-                await websocket.send_json({"type": "narrator_turn_start"})
-                await asyncio.sleep(0.1) # Um pequeno delay para garantir a ordem
-
-                sentences = re.split(r'(?<=[.!?])\s+', narrative.strip())
-                for i, sentence in enumerate(sentences):
-                    payload = sentence + " " if i < len(sentences) - 1 else sentence
-                    if payload:
-                        await websocket.send_json(
-                            {"type": "narrative_chunk", "payload": payload}
-                        )
-                        await asyncio.sleep(min(len(payload) * 0.02, 1.5))
+                turn_entries = [
+                    {"speaker": char["name"], "text": player_action},
+                    {"speaker": "Narrador", "text": narrative},
+                ]
+                session.apply_turn(
+                    turn_entries,
+                    player_damage=outcome.enemy_damage,
+                    enemy_damage=outcome.player_damage,
+                )
+                if session.finished:
+                    event["vitoria"] = battle_state["enemy_health"] <= 0
+                turn_index = battle_state["history_length"]
+
+                # Falas que saíram da janela do prompt entram no resumo acumulado
+                pending_summary = window_start - battle_state.get("summarized_until", 0)
+                if pending_summary >= settings.PROMPT_SUMMARY_MIN_ENTRIES:
+                    llm_service.schedule_history_summary(
+                        db, character_id, battle_id, battle_state, window_start
+                    )
 
                 # Envia a mensagem de finalização com o evento da rodada
                 await websocket.send_json(
-                    {"type": "narrative_end", "payload": {"event": event}}
+                    {
+                        "type": "narrative_end",
+                        "payload": {"event": event, "turn_index": turn_index},
+                    }
                 )
+                # Grava o delta do turno em segundo plano
+                session.schedule_flush()
+
+                # Já calcula as sugestões do próximo turno enquanto o jogador lê
+                if not session.finished:
+                    speculate_suggestions(
+                        session.battle_theme, battle_state["history"], turn_index
+                    )
 
             elif message["type"] == "exit_battle":
-                current_state_doc = await crud_battle.get_battle_state(db, character_id, battle_id)
-                if not current_state_doc or current_state_doc.get("status") != "concluído":
+                if not session.finished:
+                    session.discard()
+                    await session.flush()  # aguarda uma gravação em curso
+                    try:
+                        await discard_battle_memories(db, character_id, battle_id)
+                    except Exception:
+                        # Ficam para a compactação por idade
+                        log_exception()
                     await crud_battle.delete_battle_state(db, character_id, battle_id)
                 await websocket.close()
                 break
@@ -329,6 +525,15 @@ async def websocket_endpoint(
     except Exception as e:
         print(f"Erro no WebSocket: {e}")
         await websocket.close(code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    finally:
+        # A geração continua no cache; só o envio pela conexão é cancelado.
+        for task in list(suggestion_tasks):
+            task.cancel()
+        if session is not None:
+            try:
+                await session.close()
+            except Exception:
+                log_exception()
 
 
 @router.get(
@@ -345,7 +550,10 @@ async def get_most_recent_battle_state(
         raise HTTPException(status_code=403, detail="Acesso negado.")
 
     battle_state = await crud_battle.get_most_recent_battle_state(
-        db, character_id, str(current_user["_id"])
+        db,
+        character_id,
+        str(current_user["_id"]),
+        history_tail=settings.BATTLE_HISTORY_TAIL,
     )
     if not battle_state:
         raise HTTPException(
@@ -370,11 +578,38 @@ async def get_specific_battle_state(
         raise HTTPException(status_code=403, detail="Acesso negado.")
 
     battle_state = await crud_battle.get_battle_state_by_character_and_user(
-        db, character_id, battle_id, str(current_user["_id"])
+        db,
+        character_id,
+        battle_id,
+        str(current_user["_id"]),
+        history_tail=settings.BATTLE_HISTORY_TAIL,
     )
     if not battle_state:
         raise HTTPException(
             status_code=404, detail="Nenhum estado de batalha encontrado para esta combinação."
         )
 
-    return serialize_object_id(battle_state)
\ No newline at end of file
+    return serialize_object_id(battle_state)
+
+
+@router.get(
+    "/state/{character_id}/{battle_id}/history",
+    summary="Retorna uma página do histórico de uma batalha.",
+)
+async def get_battle_history(
+    character_id: str,
+    battle_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncIOMotorDatabase = Depends(deps.get_db),
+    current_user=Depends(deps.get_current_user),
+):
+    page = await crud_battle.get_battle_history_page(
+        db, character_id, battle_id, str(current_user["_id"]), offset, limit
+    )
+    if not page:
+        raise HTTPException(
+            status_code=404, detail="Nenhum estado de batalha encontrado para esta combinação."
+        )
+
+    return {"offset": offset, "limit": limit, **page}
\ No newline at end of file
@@ -4,7 +4,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.api import deps
 from app.schemas.character import CharacterCreate
 from app.crud import character as crud_character
-from app.core.leveling import get_xp_for_next_level
+from app.core.leveling import ATTRIBUTE_POINTS_PER_LEVEL, get_xp_for_next_level
 from typing import Dict, List 
 
 router = APIRouter()
@@ -71,23 +71,23 @@ async def add_experience(
         
         if "attributes.strength" not in attributes_to_increment:
             attributes_to_increment["attributes.strength"] = 0
-        attributes_to_increment["attributes.strength"] += 2 
+        attributes_to_increment["attributes.strength"] += ATTRIBUTE_POINTS_PER_LEVEL
 
         if "attributes.intelligence" not in attributes_to_increment:
             attributes_to_increment["attributes.intelligence"] = 0
-        attributes_to_increment["attributes.intelligence"] += 2
+        attributes_to_increment["attributes.intelligence"] += ATTRIBUTE_POINTS_PER_LEVEL
 
         if "attributes.charisma" not in attributes_to_increment:
             attributes_to_increment["attributes.charisma"] = 0
-        attributes_to_increment["attributes.charisma"] += 2
+        attributes_to_increment["attributes.charisma"] += ATTRIBUTE_POINTS_PER_LEVEL
 
         if "attributes.dexterity" not in attributes_to_increment:
             attributes_to_increment["attributes.dexterity"] = 0
-        attributes_to_increment["attributes.dexterity"] += 2
+        attributes_to_increment["attributes.dexterity"] += ATTRIBUTE_POINTS_PER_LEVEL
 
         if "attributes.intuition" not in attributes_to_increment:
             attributes_to_increment["attributes.intuition"] = 0
-        attributes_to_increment["attributes.intuition"] += 2
+        attributes_to_increment["attributes.intuition"] += ATTRIBUTE_POINTS_PER_LEVEL
         
         xp_needed = get_xp_for_next_level(new_level)
 
@@ -0,0 +1,79 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.api import deps
+from app.core import auth_cache
+from app.core.config import settings
+from app.core.database import pool_metrics
+from app.core.executors import get_inference_executor, get_password_executor
+from app.core.free_llms import llm_router
+from app.core.llm_clients import provider_sessions
+from app.services import battle_session, llm_service
+from app.services.memory_compaction import memory_compactor
+
+router = APIRouter()
+
+
+@router.get("/live", summary="Verifica se o processo está respondendo")
+async def liveness():
+    return {"status": "ok"}
+
+
+@router.get("/ready", summary="Verifica se a API está pronta para receber tráfego")
+async def readiness(db: AsyncIOMotorDatabase = Depends(deps.get_db)):
+    """
+    Só fica pronta quando o MongoDB responde e os modelos de IA
+    (embedding, reranker e coleção do ChromaDB) já foram carregados.
+    """
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=2)
+        mongodb_ok = True
+    except Exception:
+        mongodb_ok = False
+
+    # Sem aquecimento no início, os modelos carregam no primeiro uso e não
+    # bloqueiam a prontidão.
+    models_ok = llm_service.models_loaded() or not settings.WARMUP_ON_STARTUP
+    checks = {"mongodb": mongodb_ok, "models": models_ok}
+    ready = all(checks.values())
+    status_code = status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "ready" if ready else "starting", "checks": checks},
+    )
+
+
+@router.get(
+    "/llm",
+    summary="Estado dos provedores de LLM",
+    dependencies=[Depends(deps.require_metrics_access)],
+)
+async def llm_health():
+    return {"routing": llm_router.snapshot(), "pools": provider_sessions.stats()}
+
+
+@router.get(
+    "/metrics",
+    summary="Métricas internas de executores e caches",
+    dependencies=[Depends(deps.require_metrics_access)],
+)
+async def metrics():
+    return {
+        "inference_executor": get_inference_executor().stats(),
+        "password_executor": get_password_executor().stats(),
+        "mongo_pool": pool_metrics.stats(),
+        "auth_cache": auth_cache.stats(),
+        "battle_sessions": battle_session.stats(),
+        "llm_cache": llm_service.prompt_cache.stats(),
+        "embedding_cache": llm_service.embedding_cache.stats(),
+        "interaction_buffer": llm_service.interaction_buffer.stats(),
+        "hot_memory": llm_service.hot_memory.stats(),
+        "rerank_batcher": llm_service.rerank_batcher.stats(),
+        "rerank_policy": llm_service.rerank_policy(),
+        "memory_compaction": memory_compactor.stats(),
+        "opening_pool": llm_service.opening_pool.stats(),
+        "speculative_suggestions": llm_service.speculative_suggestions.stats(),
+    }
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, characters, campaign
+from app.api.v1.endpoints import auth, users, characters, campaign, health
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -8,3 +8,4 @@ api_router.include_router(characters.router, prefix="/characters", tags=["charac
 api_router.include_router(
     campaign.router, prefix="/campaign", tags=["campaign", "historico"]
 )
+api_router.include_router(health.router, prefix="/health", tags=["health"])
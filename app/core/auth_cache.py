@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from jose import JWTError, jwt
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.log_util import log_exception
+from app.utils.ttl_cache import TTLCache
+
+InvalidationHook = Callable[[str], Awaitable[None]]
+
+# Assunto (email) de cada token já verificado, pela hash do token.
+token_cache = TTLCache(
+    settings.AUTH_TOKEN_CACHE_MAX_ENTRIES, settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+)
+# Documento do usuário resolvido, pelo email.
+user_cache = TTLCache(
+    settings.AUTH_USER_CACHE_MAX_ENTRIES, settings.AUTH_USER_CACHE_TTL_SECONDS
+)
+
+_invalidation_hooks: List[InvalidationHook] = []
+# Incrementado a cada invalidação: uma busca iniciada antes dela não é guardada.
+_generation = 0
+
+
+def decode_token_subject(token: str) -> Optional[str]:
+    """Verifica o JWT (uma vez por token, enquanto estiver no cache) e retorna o `sub`."""
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    subject = token_cache.get(key)
+    if subject is not None:
+        return subject
+
+    try:
+        payload = jwt.decode(
+            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        )
+    except JWTError:
+        return None
+    subject = payload.get("sub")
+    if subject is None:
+        return None
+
+    ttl = token_cache.ttl
+    if payload.get("exp") is not None:
+        # Nunca aceita o token do cache depois de ele expirar.
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(key, subject, ttl=ttl)
+    return subject
+
+
+def generation() -> int:
+    return _generation
+
+
+def cache_user(email: str, user: dict, fetched_at_generation: int):
+    """Guarda o usuário, a menos que ele tenha sido invalidado durante a busca."""
+    if fetched_at_generation == _generation:
+        user_cache.set(email, user)
+
+
+def apply_invalidation(email: str):
+    """Remove o usuário do cache local, sem avisar os outros workers."""
+    global _generation
+    _generation += 1
+    user_cache.pop(email)
+
+
+def register_invalidation_hook(hook: InvalidationHook):
+    """Registra uma função chamada a cada invalidação, para avisar outros workers."""
+    _invalidation_hooks.append(hook)
+
+
+async def _run_hook(hook: InvalidationHook, email: str):
+    try:
+        await hook(email)
+    except Exception:
+        log_exception()
+
+
+def invalidate_user(email: str):
+    """Remove o usuário do cache local e propaga a invalidação pelos hooks."""
+    apply_invalidation(email)
+    for hook in _invalidation_hooks:
+        asyncio.create_task(_run_hook(hook, email))
+
+
+class MongoUserInvalidation:
+    """
+    Propaga invalidações entre workers pela coleção `user_cache_invalidations`:
+    cada worker grava as suas e consulta periodicamente as novas (reler uma
+    invalidação é inofensivo). Os documentos expiram por um índice TTL.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, poll_interval: float):
+        self.db = db
+        self.poll_interval = poll_interval
+        self._since = datetime.utcnow()
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, email: str):
+        await self.db.user_cache_invalidations.insert_one(
+            {"email": email, "at": datetime.utcnow()}
+        )
+
+    async def poll(self):
+        invalidations = await self.db.user_cache_invalidations.find(
+            {"at": {"$gte": self._since}}
+        ).to_list(None)
+        for invalidation in invalidations:
+            apply_invalidation(invalidation["email"])
+            self._since = max(self._since, invalidation["at"])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception:
+                log_exception()
+
+    def start(self):
+        register_invalidation_hook(self.publish)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.publish in _invalidation_hooks:
+            _invalidation_hooks.remove(self.publish)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def stats():
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
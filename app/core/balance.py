@@ -0,0 +1,260 @@
+"""
+Simulador de balanceamento: roda batalhas inteiras com o motor de combate,
+sem LLM, para avaliar fórmulas de dano, vida inicial e curva de níveis.
+
+Os personagens são sorteados por nível, com os atributos de criação num
+intervalo e os pontos ganhos por nível somados. Exemplo:
+
+    python -m app.core.balance --battles 1000000 --levels 1-10 --seed 42
+"""
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core import combat
+from app.core.leveling import ATTRIBUTE_POINTS_PER_LEVEL, get_xp_for_next_level
+from app.schemas.character import Attributes
+
+ATTRIBUTE_NAMES = tuple(Attributes.model_fields)
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class LevelReport:
+    level: int
+    battles: int
+    win_rate: float
+    loss_rate: float
+    timeout_rate: float
+    # Percentis de turnos até o fim, só das batalhas que terminaram
+    turns: Dict[str, float]
+    xp_for_next_level: int
+
+
+@dataclass
+class SimulationReport:
+    battles: int
+    rounds: int
+    win_rate: float
+    loss_rate: float
+    timeout_rate: float
+    turns: Dict[str, float]
+    levels: List[LevelReport]
+    elapsed: float
+    battles_per_second: float
+    rounds_per_second: float
+
+
+def sample_attributes(
+    levels: np.ndarray, attribute_range: Tuple[int, int], rng: np.random.Generator
+) -> Dict[str, np.ndarray]:
+    """Atributos de criação sorteados no intervalo, mais os ganhos por nível."""
+    low, high = attribute_range
+    gained = (levels - 1) * ATTRIBUTE_POINTS_PER_LEVEL
+    return {
+        name: rng.integers(low, high + 1, size=levels.size) + gained
+        for name in ATTRIBUTE_NAMES
+    }
+
+
+def simulate_battles(
+    attributes: Dict[str, np.ndarray],
+    rng: np.random.Generator,
+    special_rate: float = 0.2,
+    max_turns: int = 200,
+    player_health: int = combat.PLAYER_START_HEALTH,
+    enemy_health: int = combat.ENEMY_START_HEALTH,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Roda uma batalha por personagem, todas juntas, turno a turno.
+    Devolve o turno em que cada uma terminou (0 se atingiu `max_turns`),
+    se o jogador venceu e o total de rodadas resolvidas.
+
+    Como no websocket, a batalha termina quando uma das vidas chega a zero
+    e conta como vitória se o inimigo caiu (mesmo que o jogador também).
+    """
+    strength = attributes["strength"]
+    dexterity = attributes["dexterity"]
+    size = strength.size
+    player = np.full(size, player_health, dtype=np.int64)
+    enemy = np.full(size, enemy_health, dtype=np.int64)
+    finished_at = np.zeros(size, dtype=np.int64)
+    active = np.arange(size)
+    rounds = 0
+
+    for turn in range(1, max_turns + 1):
+        if not active.size:
+            break
+        special = rng.random(active.size) < special_rate
+        batch = combat.resolve_rounds(strength[active], dexterity[active], special, rng)
+        player[active] -= batch.enemy_damage
+        enemy[active] -= batch.player_damage
+        rounds += active.size
+
+        ended = (player[active] <= 0) | (enemy[active] <= 0)
+        finished_at[active[ended]] = turn
+        active = active[~ended]
+
+    won = (finished_at > 0) & (enemy <= 0)
+    return finished_at, won, rounds
+
+
+def _turn_percentiles(finished_at: np.ndarray) -> Dict[str, float]:
+    turns = finished_at[finished_at > 0]
+    if not turns.size:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+    values = np.percentile(turns, PERCENTILES)
+    return {f"p{p}": float(value) for p, value in zip(PERCENTILES, values)}
+
+
+def _rates(finished_at: np.ndarray, won: np.ndarray) -> Tuple[float, float, float]:
+    total = max(finished_at.size, 1)
+    wins = int(won.sum())
+    timeouts = int((finished_at == 0).sum())
+    losses = finished_at.size - wins - timeouts
+    return wins / total, losses / total, timeouts / total
+
+
+def simulate(
+    battles: int,
+    levels: Tuple[int, int] = (1, 10),
+    attribute_range: Tuple[int, int] = (1, 10),
+    special_rate: float = 0.2,
+    max_turns: int = 200,
+    player_health: int = combat.PLAYER_START_HEALTH,
+    enemy_health: int = combat.ENEMY_START_HEALTH,
+    batch_size: int = 250_000,
+    seed: Optional[int] = None,
+) -> SimulationReport:
+    """
+    Simula `battles` batalhas com níveis sorteados uniformemente em `levels`
+    (inclusivo), em lotes de até `batch_size` para limitar a memória.
+    """
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    all_levels, all_finished, all_won = [], [], []
+    rounds = 0
+
+    for start in range(0, battles, batch_size):
+        size = min(batch_size, battles - start)
+        batch_levels = rng.integers(levels[0], levels[1] + 1, size=size)
+        attributes = sample_attributes(batch_levels, attribute_range, rng)
+        finished_at, won, batch_rounds = simulate_battles(
+            attributes, rng, special_rate, max_turns, player_health, enemy_health
+        )
+        all_levels.append(batch_levels)
+        all_finished.append(finished_at)
+        all_won.append(won)
+        rounds += batch_rounds
+
+    elapsed = time.perf_counter() - started
+    level_of = np.concatenate(all_levels) if all_levels else np.zeros(0, np.int64)
+    finished_at = np.concatenate(all_finished) if all_finished else level_of
+    won = np.concatenate(all_won) if all_won else level_of.astype(bool)
+
+    level_reports = []
+    for level in range(levels[0], levels[1] + 1):
+        mask = level_of == level
+        win_rate, loss_rate, timeout_rate = _rates(finished_at[mask], won[mask])
+        level_reports.append(
+            LevelReport(
+                level=level,
+                battles=int(mask.sum()),
+                win_rate=win_rate,
+                loss_rate=loss_rate,
+                timeout_rate=timeout_rate,
+                turns=_turn_percentiles(finished_at[mask]),
+                xp_for_next_level=get_xp_for_next_level(level),
+            )
+        )
+
+    win_rate, loss_rate, timeout_rate = _rates(finished_at, won)
+    return SimulationReport(
+        battles=battles,
+        rounds=rounds,
+        win_rate=win_rate,
+        loss_rate=loss_rate,
+        timeout_rate=timeout_rate,
+        turns=_turn_percentiles(finished_at),
+        levels=level_reports,
+        elapsed=elapsed,
+        battles_per_second=battles / elapsed if elapsed else 0.0,
+        rounds_per_second=rounds / elapsed if elapsed else 0.0,
+    )
+
+
+# --- Linha de Comando ---
+
+
+def _range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def format_report(report: SimulationReport) -> str:
+    percentiles = " ".join(f"p{p}" for p in PERCENTILES)
+    lines = [
+        f"{report.battles} batalhas, {report.rounds} rodadas em {report.elapsed:.2f}s "
+        f"({report.battles_per_second:,.0f} batalhas/s, "
+        f"{report.rounds_per_second:,.0f} rodadas/s)",
+        f"vitórias {report.win_rate:.1%}  derrotas {report.loss_rate:.1%}  "
+        f"sem fim {report.timeout_rate:.1%}  turnos "
+        + " ".join(f"{value:g}" for value in report.turns.values()),
+        "",
+        f"{'nível':>5} {'batalhas':>9} {'vitórias':>9} {'derrotas':>9} "
+        f"{'sem fim':>8}  turnos ({percentiles})  XP p/ próximo",
+    ]
+    for level in report.levels:
+        turns = " ".join(f"{value:g}" for value in level.turns.values())
+        lines.append(
+            f"{level.level:>5} {level.battles:>9} {level.win_rate:>9.1%} "
+            f"{level.loss_rate:>9.1%} {level.timeout_rate:>8.1%}  {turns:<18} "
+            f"{level.xp_for_next_level:>6}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Simula batalhas para avaliar o balanceamento do combate."
+    )
+    parser.add_argument("--battles", type=int, default=1_000_000)
+    parser.add_argument("--levels", type=_range, default=(1, 10), help="ex.: 1-10 ou 5")
+    parser.add_argument(
+        "--attributes",
+        type=_range,
+        default=(1, 10),
+        help="intervalo dos atributos de criação, ex.: 1-10",
+    )
+    parser.add_argument("--special-rate", type=float, default=0.2)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--player-health", type=int, default=combat.PLAYER_START_HEALTH)
+    parser.add_argument("--enemy-health", type=int, default=combat.ENEMY_START_HEALTH)
+    parser.add_argument("--batch-size", type=int, default=250_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args(argv)
+
+    report = simulate(
+        args.battles,
+        levels=args.levels,
+        attribute_range=args.attributes,
+        special_rate=args.special_rate,
+        max_turns=args.max_turns,
+        player_health=args.player_health,
+        enemy_health=args.enemy_health,
+        batch_size=args.batch_size,
+        seed=args.seed,
+    )
+    print(json.dumps(asdict(report), indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
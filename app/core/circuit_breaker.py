@@ -0,0 +1,156 @@
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProviderError(Exception):
+    """Falha de um provedor de LLM com o status HTTP e o `Retry-After`, se houver."""
+
+    def __init__(
+        self,
+        provider: str,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def trips_breaker(self) -> bool:
+        """
+        Só sobrecarga (429), erro do servidor (5xx) ou falha sem status contam
+        para o disjuntor; outros 4xx vêm da requisição ou da configuração.
+        """
+        return self.status is None or self.status == 429 or self.status >= 500
+
+    @property
+    def auth_failed(self) -> bool:
+        """Chave recusada (401/403): não se resolve sozinha, como sem configuração."""
+        return self.status in (401, 403)
+
+
+class ProviderNotConfiguredError(ProviderError):
+    """O provedor não tem chave de API ou conta configurada."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o header `Retry-After` (segundos ou data HTTP) em segundos."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Disjuntor de um provedor: após falhas consecutivas fica aberto durante o
+    cooldown, depois deixa passar uma requisição de teste (meio-aberto) e volta a
+    fechar se ela tiver sucesso. Falhas seguidas dobram o cooldown até o máximo.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+        half_open_probes: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.current_cooldown = cooldown
+        self.open_until = 0.0
+        self.probes_in_flight = 0
+        self.last_error: Optional[str] = None
+        self.trips = 0
+
+    def _refresh(self):
+        if self.state == OPEN and time.monotonic() >= self.open_until:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            print(f"Disjuntor {self.name}: meio-aberto, testando o provedor.")
+
+    def available(self) -> bool:
+        """Indica, sem reservar nada, se uma chamada seria permitida agora."""
+        self._refresh()
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN:
+            return self.probes_in_flight < self.half_open_probes
+        return False
+
+    def acquire(self) -> bool:
+        """Reserva a permissão para uma chamada (no meio-aberto, ocupa uma sonda)."""
+        if not self.available():
+            return False
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+        return True
+
+    def release(self):
+        """Libera a sonda de uma chamada cancelada antes de terminar."""
+        if self.state == HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
+    def record_success(self):
+        if self.state != CLOSED:
+            print(f"Disjuntor {self.name}: fechado, provedor recuperado.")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.current_cooldown = self.base_cooldown
+        self.probes_in_flight = 0
+
+    def record_failure(
+        self, error: Optional[str] = None, retry_after: Optional[float] = None
+    ):
+        self.last_error = error
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+            self.trip()
+        elif retry_after is not None:
+            self.trip(retry_after)
+        elif self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self, cooldown: Optional[float] = None):
+        """Abre o disjuntor pelo tempo indicado (ou pelo cooldown atual)."""
+        duration = self.current_cooldown if cooldown is None else cooldown
+        self.state = OPEN
+        self.open_until = time.monotonic() + duration
+        self.probes_in_flight = 0
+        self.trips += 1
+        print(f"Disjuntor {self.name}: aberto por {duration:.0f}s ({self.last_error}).")
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._refresh()
+        retry_in = max(self.open_until - time.monotonic(), 0.0)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "retry_in": round(retry_in, 1) if self.state == OPEN else 0.0,
+            "last_error": self.last_error,
+        }
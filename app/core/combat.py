@@ -0,0 +1,133 @@
+"""
+Motor de combate: resolve as rodadas de forma determinística e vetorizada.
+
+O resultado de cada rodada é calculado aqui, antes do prompt, e é a fonte de
+verdade para o dano aplicado à vida do jogador e do inimigo; a LLM apenas o
+narra. Com o mesmo gerador (semente da batalha e índice do turno) a rodada
+se repete exatamente. A semente é um HMAC com um segredo do servidor, para
+que o cliente não consiga prever as rodadas a partir dos ids da batalha.
+"""
+
+import hashlib
+import hmac
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+PLAYER_START_HEALTH = 200
+ENEMY_START_HEALTH = 450
+
+# Dano do jogador: força vezes um multiplicador sorteado no intervalo (inclusivo)
+PLAYER_DAMAGE_MULTIPLIER = (5, 10)
+ENEMY_DAMAGE = (10, 20)
+SPECIAL_ATTACK_MULTIPLIER = 2
+SPECIAL_ACTION_KEYWORDS = ("especial", "habilidade")
+
+# Chances de esquiva, em pontos percentuais
+PLAYER_DODGE_PER_DEXTERITY = 2
+ENEMY_DODGE_CHANCE = 10
+
+
+@dataclass(frozen=True)
+class RoundOutcome:
+    """Resultado de uma rodada. `player_damage` é o dano causado pelo jogador."""
+
+    player_damage: int
+    enemy_damage: int
+    player_dodged: bool
+    enemy_dodged: bool
+    special: bool
+
+
+@dataclass(frozen=True)
+class RoundBatch:
+    """Resultado de várias rodadas de uma vez, um elemento por rodada."""
+
+    player_damage: np.ndarray
+    enemy_damage: np.ndarray
+    player_dodged: np.ndarray
+    enemy_dodged: np.ndarray
+    special: np.ndarray
+
+
+def is_special_action(player_action: str) -> bool:
+    action = player_action.lower()
+    return any(keyword in action for keyword in SPECIAL_ACTION_KEYWORDS)
+
+
+def battle_seed(character_id: str, battle_id: str, secret: str) -> int:
+    """Semente estável de uma batalha (não depende do PYTHONHASHSEED)."""
+    digest = hmac.new(
+        secret.encode("utf-8"),
+        f"{character_id}:{battle_id}".encode("utf-8"),
+        hashlib.sha256,
+    ).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def round_rng(
+    character_id: str, battle_id: Optional[str], turn_index: int, secret: str
+) -> np.random.Generator:
+    """Gerador da rodada; sem `battle_id` (batalha sem estado) não é reprodutível."""
+    if battle_id is None:
+        return np.random.default_rng()
+    seed = battle_seed(character_id, battle_id, secret)
+    return np.random.default_rng([seed, turn_index])
+
+
+def resolve_rounds(
+    strength: ArrayLike,
+    dexterity: ArrayLike,
+    special: ArrayLike,
+    rng: np.random.Generator,
+    size: Optional[int] = None,
+) -> RoundBatch:
+    """
+    Resolve `size` rodadas (por padrão, o tamanho dos atributos após broadcast).
+    Atributos e `special` podem ser escalares ou arrays, um valor por rodada.
+    """
+    strength = np.asarray(strength, dtype=np.int64)
+    dexterity = np.asarray(dexterity, dtype=np.int64)
+    special = np.asarray(special, dtype=bool)
+    if size is None:
+        size = np.broadcast(strength, dexterity, special).size
+
+    low, high = PLAYER_DAMAGE_MULTIPLIER
+    player_damage = strength * rng.integers(low, high + 1, size=size)
+    player_damage = np.where(
+        special, player_damage * SPECIAL_ATTACK_MULTIPLIER, player_damage
+    )
+    low, high = ENEMY_DAMAGE
+    enemy_damage = rng.integers(low, high + 1, size=size)
+
+    player_dodged = (
+        rng.integers(1, 101, size=size) <= dexterity * PLAYER_DODGE_PER_DEXTERITY
+    )
+    enemy_dodged = rng.integers(1, 101, size=size) <= ENEMY_DODGE_CHANCE
+
+    return RoundBatch(
+        player_damage=np.where(enemy_dodged, 0, player_damage),
+        enemy_damage=np.where(player_dodged, 0, enemy_damage),
+        player_dodged=player_dodged,
+        enemy_dodged=enemy_dodged,
+        special=np.broadcast_to(special, (size,)),
+    )
+
+
+def resolve_round(
+    attributes: dict, player_action: str, rng: np.random.Generator
+) -> RoundOutcome:
+    """Resolve uma rodada para os atributos do personagem e a ação do jogador."""
+    special = is_special_action(player_action)
+    batch = resolve_rounds(
+        attributes["strength"], attributes["dexterity"], special, rng, size=1
+    )
+    return RoundOutcome(
+        player_damage=int(batch.player_damage[0]),
+        enemy_damage=int(batch.enemy_damage[0]),
+        player_dodged=bool(batch.player_dodged[0]),
+        enemy_dodged=bool(batch.enemy_dodged[0]),
+        special=special,
+    )
@@ -1,7 +1,8 @@
 # rpgnexus-backend/app/core/config.py
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -21,9 +22,167 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "RPG Textual API"
     API_V1_STR: str = "/api/v1"
     ALGORITHM: str = "HS256"
+    # Token exigido em /health/metrics e /health/llm (sem ele, ficam desativados)
+    METRICS_TOKEN: Optional[str] = None
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+
+    # Caches de autenticação: tokens já verificados e usuários resolvidos
+    AUTH_TOKEN_CACHE_TTL_SECONDS: float = 300.0
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60.0
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+    # Intervalo de leitura das invalidações de outros workers (0 desativa)
+    AUTH_CACHE_INVALIDATION_POLL_SECONDS: float = 2.0
     DB_NAME: str = "rpg_textual"
 
+    # Pool de conexões do MongoDB (um cliente por processo)
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 5
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_CONNECT_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: Optional[int] = None
+    # Lista separada por vírgulas: "zstd", "snappy" e "zlib" (vazio desativa)
+    MONGO_COMPRESSORS: str = "zlib"
+    MONGO_READ_PREFERENCE: str = "primary"
+
+    # Cria os índices do MongoDB na inicialização (idempotente)
+    MONGO_ENSURE_INDEXES: bool = True
+
+    # Executor de inferência (embedding, ChromaDB e reranker)
+    INFERENCE_EXECUTOR_KIND: str = "thread"  # "thread" ou "process"
+    INFERENCE_MAX_WORKERS: int = 2
+    INFERENCE_MAX_QUEUE: int = 32
+    INFERENCE_TIMEOUT_SECONDS: float = 15.0
+
+    # Executor de senhas: o bcrypt libera o GIL, então threads bastam
+    PASSWORD_EXECUTOR_KIND: str = "thread"  # "thread" ou "process"
+    PASSWORD_MAX_WORKERS: int = 2
+    PASSWORD_MAX_QUEUE: int = 64
+    PASSWORD_TIMEOUT_SECONDS: float = 10.0
+    # Custo do bcrypt; hashes com outro custo são refeitos no login
+    BCRYPT_ROUNDS: int = 12
+
+    # Gravação em lote das interações no ChromaDB
+    MEMORY_FLUSH_INTERVAL_SECONDS: float = 0.5
+    MEMORY_FLUSH_MAX_BATCH: int = 64
+    # Limite da fila de escrita; as entradas mais antigas são descartadas
+    MEMORY_FLUSH_MAX_PENDING: int = 10000
+
+    # Aquecimento dos modelos no início da aplicação
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 300.0
+
+    # Pool de conexões HTTP com os provedores de LLM
+    LLM_HTTP_POOL_SIZE: int = 100
+    LLM_HTTP_POOL_SIZE_PER_HOST: int = 20
+    LLM_HTTP_KEEPALIVE_SECONDS: float = 60.0
+    LLM_HTTP_DNS_TTL_SECONDS: int = 300
+    LLM_HTTP_TIMEOUT_SECONDS: float = 60.0
+    LLM_HTTP_CONNECT_TIMEOUT_SECONDS: float = 10.0
+    LLM_HTTP_COMPRESSION: bool = True
+
+    # Roteamento entre provedores de LLM
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2
+    LLM_HEDGING_ENABLED: bool = True
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 1.5
+    LLM_HEDGE_MAX_DELAY_SECONDS: float = 8.0
+
+    # Disjuntores (circuit breakers) por provedor de LLM
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 3
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    LLM_BREAKER_MAX_COOLDOWN_SECONDS: float = 600.0
+
+    # Ritmo de envio da narrativa no WebSocket ("none", "server" ou "batched")
+    WS_PACING_MODE: str = "server"
+    WS_PACING_BATCH_CHARS: int = 80
+    WS_PACING_BATCH_INTERVAL_SECONDS: float = 0.25
+
+    # Quantas entradas do fim do histórico são lidas ao carregar uma batalha
+    BATTLE_HISTORY_TAIL: int = 50
+
+    # Orçamento de tokens por seção do prompt de continuação
+    PROMPT_INSTRUCTIONS_TOKENS: int = 300
+    PROMPT_MEMORY_TOKENS: int = 400
+    PROMPT_HISTORY_TOKENS: int = 1200
+    # Turnos mais recentes mantidos na íntegra; os anteriores viram resumo
+    PROMPT_HISTORY_MAX_TURNS: int = 6
+    PROMPT_SUMMARY_MIN_ENTRIES: int = 8
+    PROMPT_SUMMARY_MAX_ENTRIES: int = 40
+
+    # Cache de respostas da LLM
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: float = 3600.0
+    LLM_CACHE_MAX_ENTRIES: int = 1000
+    # A camada semântica é opcional por chamada (`semantic=True`); hoje nenhum
+    # prompt a usa, pois todos levam dados do personagem
+    LLM_CACHE_SEMANTIC_THRESHOLD: float = 0.95
+
+    # Cache de embeddings (limite em bytes; "float16" ou "float32")
+    EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    EMBEDDING_CACHE_DTYPE: str = "float16"
+
+    # Camada quente de memórias por personagem em batalha
+    MEMORY_HOT_TIER_ENABLED: bool = True
+    MEMORY_HOT_TIER_MAX_CHARACTERS: int = 256
+    MEMORY_HOT_TIER_MAX_VECTORS: int = 5000
+    MEMORY_HOT_TIER_IDLE_SECONDS: float = 900.0
+    # Intervalo de consulta das descargas da camada quente pedidas por outros
+    # workers (memórias compactadas ou apagadas); 0 desativa
+    MEMORY_HOT_TIER_INVALIDATION_POLL_SECONDS: float = 5.0
+
+    # Micro-lotes do reranker: janela de espera e máximo de pares por lote
+    RERANK_BATCH_WINDOW_SECONDS: float = 0.008
+    RERANK_MAX_BATCH_PAIRS: int = 64
+
+    # Política do reranker: pular quando há poucos candidatos, usar a ordem dos
+    # embeddings acima desta ocupação do executor e quantização int8 em CPU
+    RERANK_SKIP_SMALL: bool = True
+    RERANK_LOAD_SHEDDING: bool = True
+    RERANK_SHED_UTILIZATION: float = 0.75
+    RERANK_QUANTIZE_INT8: bool = False
+
+    # Compactação da memória de batalhas concluídas em resumos
+    MEMORY_COMPACTION_ENABLED: bool = True
+    MEMORY_COMPACTION_INTERVAL_SECONDS: float = 3600.0
+    MEMORY_COMPACTION_CHUNK_SIZE: int = 40
+    MEMORY_COMPACTION_MAX_SUMMARIES: int = 20
+    MEMORY_COMPACTION_BATTLES_PER_RUN: int = 50
+    # Concessão no MongoDB para um único worker compactar por vez; é renovada a
+    # cada personagem e expira sozinha se o worker cair
+    MEMORY_COMPACTION_LEASE_SECONDS: float = 900.0
+    # Memórias brutas mais antigas que isto viram resumo mesmo fora de uma
+    # batalha concluída (sem battle_id, batalhas apagadas ou abandonadas);
+    # personagens verificados por rodada, em ciclo
+    MEMORY_COMPACTION_STALE_AFTER_SECONDS: float = 7 * 24 * 3600.0
+    MEMORY_COMPACTION_STALE_CHARACTERS_PER_RUN: int = 50
+
+    # Reserva de aberturas de batalha pré-geradas
+    DEFAULT_BATTLE_THEME: str = "Conflito na Nebulosa Primordial"
+    OPENING_POOL_ENABLED: bool = True
+    OPENING_POOL_THEMES: List[str] = ["Conflito na Nebulosa Primordial"]
+    OPENING_POOL_SIZE: int = 3
+    OPENING_POOL_TOP_COMBINATIONS: int = 5
+    OPENING_POOL_MAX_KEYS: int = 50
+    OPENING_POOL_REFILL_INTERVAL_SECONDS: float = 2.0
+
+    # Sugestões de ação especulativas enviadas pelo WebSocket
+    SPECULATIVE_SUGGESTIONS_ENABLED: bool = True
+    SUGGESTIONS_CACHE_MAX_ENTRIES: int = 2000
+    SUGGESTIONS_CACHE_TTL_SECONDS: float = 600.0
+
+    @model_validator(mode="after")
+    def check_hot_tier_executor(self) -> "Settings":
+        # A camada quente é preenchida no processo que grava e consulta; com
+        # executor de processos ela ficaria nos filhos e nunca seria usada.
+        if self.MEMORY_HOT_TIER_ENABLED and self.INFERENCE_EXECUTOR_KIND == "process":
+            raise ValueError(
+                "MEMORY_HOT_TIER_ENABLED exige INFERENCE_EXECUTOR_KIND='thread'; "
+                "desative a camada quente para usar o executor de processos."
+            )
+        return self
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,187 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+from app.core.config import settings
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Coleta eventos CMAP do pool de conexões do MongoDB: tempo de espera no
+    checkout, conexões em uso por servidor e falhas de checkout.
+
+    O pymongo emite o início e o fim do checkout na mesma thread, então o
+    início fica guardado numa variável local da thread.
+    """
+
+    def __init__(self, max_pool_size: int):
+        self.max_pool_size = max_pool_size
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._checked_out: Dict[str, int] = {}
+        self._open: Dict[str, int] = {}
+        self._stats = {
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checkout_timeouts": 0,
+            "checkout_wait_total": 0.0,
+            "checkout_wait_max": 0.0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "pool_clears": 0,
+            "max_checked_out": 0,
+        }
+
+    @staticmethod
+    def _address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def _wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait = self._wait()
+        address = self._address(event)
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_wait_total"] += wait
+            self._stats["checkout_wait_max"] = max(
+                self._stats["checkout_wait_max"], wait
+            )
+            in_use = self._checked_out.get(address, 0) + 1
+            self._checked_out[address] = in_use
+            self._stats["max_checked_out"] = max(self._stats["max_checked_out"], in_use)
+
+    def connection_check_out_failed(self, event):
+        self._wait()
+        with self._lock:
+            self._stats["checkout_failures"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self._stats["checkout_timeouts"] += 1
+
+    def connection_checked_in(self, event):
+        address = self._address(event)
+        with self._lock:
+            self._checked_out[address] = max(self._checked_out.get(address, 0) - 1, 0)
+
+    def connection_created(self, event):
+        address = self._address(event)
+        with self._lock:
+            self._stats["connections_created"] += 1
+            self._open[address] = self._open.get(address, 0) + 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        address = self._address(event)
+        with self._lock:
+            self._stats["connections_closed"] += 1
+            self._open[address] = max(self._open.get(address, 0) - 1, 0)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._stats["pool_clears"] += 1
+
+    def pool_closed(self, event):
+        address = self._address(event)
+        with self._lock:
+            self._checked_out.pop(address, None)
+            self._open.pop(address, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            busiest = max(self._checked_out.values(), default=0)
+            return {
+                **self._stats,
+                "max_pool_size": self.max_pool_size,
+                "checked_out": dict(self._checked_out),
+                "open_connections": dict(self._open),
+                "checkout_wait_avg": (
+                    self._stats["checkout_wait_total"] / checkouts if checkouts else 0.0
+                ),
+                # Fração do pool em uso no servidor mais ocupado
+                "saturation": (
+                    busiest / self.max_pool_size if self.max_pool_size else 0.0
+                ),
+            }
+
+
+pool_metrics = PoolMetrics(settings.MONGO_MAX_POOL_SIZE)
+
+# --- Cliente Único do MongoDB ---
+# Criado no lifespan (ou no primeiro uso) e compartilhado por toda a aplicação.
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def create_client() -> AsyncIOMotorClient:
+    options: Dict[str, Any] = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+        "appname": settings.PROJECT_NAME,
+        "event_listeners": [pool_metrics],
+    }
+    if settings.MONGO_SOCKET_TIMEOUT_MS is not None:
+        options["socketTimeoutMS"] = settings.MONGO_SOCKET_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return AsyncIOMotorClient(settings.MONGODB_URL, **options)
+
+
+def connect() -> AsyncIOMotorDatabase:
+    """Cria o cliente, se ainda não existir, e retorna o banco da aplicação."""
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client[settings.DB_NAME]
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    return connect()
+
+
+def close():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+# --- Cliente do ChromaDB ---
+# Criado no primeiro uso para não atrasar a importação da API.
+_chroma_client = None
+_chroma_lock = threading.Lock()
+
+
+def get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        with _chroma_lock:
+            if _chroma_client is None:
+                import chromadb
+
+                _chroma_client = chromadb.HttpClient(
+                    host=settings.CHROMA_HOST, port=settings.CHROMA_PORT
+                )
+    return _chroma_client
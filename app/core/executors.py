@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+
+class ExecutorBusyError(RuntimeError):
+    """Levantada quando a fila do executor está cheia e a tarefa é recusada."""
+
+
+class ExecutorTimeoutError(TimeoutError):
+    """Levantada quando uma tarefa excede o tempo limite configurado."""
+
+
+class BoundedExecutor:
+    """
+    Pool de threads ou processos com fila limitada e tempo limite por chamada.
+
+    Trabalho bloqueante (modelos de ML, clientes síncronos) é executado fora do
+    event loop. Cada tarefa ocupa uma vaga até terminar de fato, mesmo que o
+    chamador desista por timeout, então o limite reflete o trabalho real em curso.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str = "thread",
+        max_workers: int = 4,
+        max_queue: int = 64,
+        timeout: Optional[float] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de executor inválido: {kind}")
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+        }
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+            return self._executor
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(
+        self, func: Callable[..., Any], *args, timeout: Optional[float] = None
+    ) -> Any:
+        """Executa `func(*args)` no pool e aguarda o resultado sem bloquear o loop."""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise ExecutorBusyError(f"Executor '{self.name}' está saturado.")
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+
+        # Em processos a função precisa ser serializável, então não é embrulhada
+        # e o tempo de espera na fila não é medido.
+        call = func if self.kind == "process" else self._instrument(func, submitted_at)
+
+        try:
+            future = loop.run_in_executor(self._get_executor(), call, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        effective_timeout = timeout if timeout is not None else self.timeout
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(future), timeout=effective_timeout
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise ExecutorTimeoutError(
+                f"Tarefa no executor '{self.name}' excedeu {effective_timeout}s."
+            )
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+
+        with self._lock:
+            self._stats["completed"] += 1
+        return result
+
+    def _instrument(self, func: Callable[..., Any], submitted_at: float):
+        def call(*args):
+            wait = time.perf_counter() - submitted_at
+            with self._lock:
+                self._running += 1
+                self._stats["queue_wait_total"] += wait
+                self._stats["queue_wait_max"] = max(self._stats["queue_wait_max"], wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        return call
+
+    def utilization(self) -> float:
+        """Fração da capacidade (workers + fila) ocupada por tarefas pendentes."""
+        with self._lock:
+            return self._pending / (self.max_workers + self.max_queue)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._stats["submitted"] - self._stats["rejected"]
+            return {
+                "name": self.name,
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "running": self._running,
+                **self._stats,
+                "queue_wait_avg": (
+                    self._stats["queue_wait_total"] / started if started else 0.0
+                ),
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# --- Executor de Inferência (embedding, ChromaDB e reranker) ---
+_inference_executor: Optional[BoundedExecutor] = None
+_inference_lock = threading.Lock()
+
+
+def get_inference_executor() -> BoundedExecutor:
+    """Retorna o executor compartilhado para trabalho de inferência, criado uma vez."""
+    global _inference_executor
+    if _inference_executor is None:
+        with _inference_lock:
+            if _inference_executor is None:
+                _inference_executor = BoundedExecutor(
+                    name="inference",
+                    kind=settings.INFERENCE_EXECUTOR_KIND,
+                    max_workers=settings.INFERENCE_MAX_WORKERS,
+                    max_queue=settings.INFERENCE_MAX_QUEUE,
+                    timeout=settings.INFERENCE_TIMEOUT_SECONDS,
+                )
+    return _inference_executor
+
+
+# --- Executor de Senhas (bcrypt) ---
+_password_executor: Optional[BoundedExecutor] = None
+_password_lock = threading.Lock()
+
+
+def get_password_executor() -> BoundedExecutor:
+    """Retorna o executor compartilhado para hash e verificação de senhas."""
+    global _password_executor
+    if _password_executor is None:
+        with _password_lock:
+            if _password_executor is None:
+                _password_executor = BoundedExecutor(
+                    name="password",
+                    kind=settings.PASSWORD_EXECUTOR_KIND,
+                    max_workers=settings.PASSWORD_MAX_WORKERS,
+                    max_queue=settings.PASSWORD_MAX_QUEUE,
+                    timeout=settings.PASSWORD_TIMEOUT_SECONDS,
+                )
+    return _password_executor
+
+
+def shutdown_executors():
+    """Encerra os executores criados pela aplicação."""
+    global _inference_executor, _password_executor
+    with _inference_lock:
+        executor, _inference_executor = _inference_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+    with _password_lock:
+        executor, _password_executor = _password_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
@@ -1,15 +1,25 @@
 import os
 import json
-import aiohttp
-import google.generativeai as genai
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
+from app.core.circuit_breaker import (
+    CircuitBreaker,
+    ProviderError,
+    ProviderNotConfiguredError,
+    parse_retry_after,
+)
+from app.core.config import settings
 from app.core.log_util import log_exception
-from app.api.deps import get_chroma_client
+from app.core.llm_router import LLMRouter
+from app.core.llm_clients import CLOUDFLARE, GROQ, provider_sessions
 from dotenv import load_dotenv
 
 load_dotenv()
 
+LLM_FAILURE_MESSAGE = (
+    "Ocorreu um erro na geração da narrativa. Tente novamente mais tarde."
+)
+
 # --- Clientes Globais (Inicializados como None) ---
 _google_model = None
 _groq_headers = None
@@ -25,6 +35,8 @@ def get_google_model():
         if not api_key:
             print("AVISO: GOOGLE_AISTUDIO_KEY não encontrada no ambiente.")
             return None
+        import google.generativeai as genai
+
         genai.configure(api_key=api_key)
         model_name = os.environ.get(
             "GOOGLE_AISTUDIO_MODELS_PRIORITY", "gemini-1.5-flash"
@@ -63,11 +75,18 @@ def get_cloudflare_headers():
     return _cloudflare_headers
 
 
+def _groq_model() -> str:
+    groq_models = os.environ.get("GROQ_MODELS_PRIORITY", "llama-3.1-8b-instant").split(
+        ";"
+    )
+    return groq_models[0] if groq_models else "llama-3.1-8b-instant"
+
+
 # --- Funções de Requisição ---
 async def google_aistudio_request(messages: List[Dict[str, str]]) -> Optional[str]:
     model = get_google_model()
     if not model:
-        return None
+        raise ProviderNotConfiguredError("GOOGLE AISTUDIO", "chave não configurada")
     try:
         google_formatted_messages = [
             {"role": msg["role"], "parts": [msg["content"]]} for msg in messages
@@ -75,7 +94,11 @@ async def google_aistudio_request(messages: List[Dict[str, str]]) -> Optional[st
 
         response = await model.generate_content_async(google_formatted_messages)
         return response.text.strip()
-    except Exception:
+    except Exception as e:
+        # Erros da API do Google trazem o status HTTP em `code` (ex.: 429 de cota).
+        status = getattr(e, "code", None)
+        if isinstance(status, int):
+            raise ProviderError("GOOGLE AISTUDIO", str(e)[:200], status) from e
         log_exception()
         return None
 
@@ -83,25 +106,29 @@ async def google_aistudio_request(messages: List[Dict[str, str]]) -> Optional[st
 async def groq_request(messages: List[Dict[str, str]]) -> Optional[str]:
     headers = get_groq_headers()
     if not headers:
-        return None
+        raise ProviderNotConfiguredError("GROQ", "chave não configurada")
 
-    groq_models = os.environ.get("GROQ_MODELS_PRIORITY", "llama-3.1-8b-instant").split(
-        ";"
-    )
-    model = groq_models[0] if groq_models else "llama-3.1-8b-instant"
+    model = _groq_model()
 
     try:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                json={"model": model, "messages": messages},
-            ) as response:
-                if response.status == 200:
-                    json_response = await response.json()
-                    return json_response["choices"][0]["message"]["content"].strip()
-                else:
-                    print(f"Erro na requisição Groq: {await response.text()}")
-                    return None
+        async with provider_sessions.post(
+            GROQ,
+            "https://api.groq.com/openai/v1/chat/completions",
+            headers=headers,
+            json={"model": model, "messages": messages},
+        ) as response:
+            if response.status == 200:
+                json_response = await response.json()
+                return json_response["choices"][0]["message"]["content"].strip()
+            else:
+                raise ProviderError(
+                    "GROQ",
+                    (await response.text())[:200],
+                    response.status,
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+    except ProviderError:
+        raise
     except Exception:
         log_exception()
         return None
@@ -112,48 +139,168 @@ async def cloudflare_request(messages: List[Dict[str, str]]) -> Optional[str]:
     account_id = os.environ.get("CLOUDFLARE_ACCOUNT_ID")
 
     if not headers or not account_id:
-        return None
+        raise ProviderNotConfiguredError("CLOUDFLARE", "chave ou conta não configurada")
 
     model = "@cf/meta/llama-3-8b-instruct"
 
     try:
-        async with aiohttp.ClientSession(headers=headers) as session:
-            async with session.post(
-                f"https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/{model}",
-                json={"messages": messages},
-            ) as response:
-                if response.status == 200:
-                    json_response = await response.json()
-                    return json_response["result"]["response"].strip()
-                else:
-                    print(f"Erro na requisição Cloudflare: {await response.text()}")
-                    return None
+        async with provider_sessions.post(
+            CLOUDFLARE,
+            f"https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/{model}",
+            headers=headers,
+            json={"messages": messages},
+        ) as response:
+            if response.status == 200:
+                json_response = await response.json()
+                return json_response["result"]["response"].strip()
+            else:
+                raise ProviderError(
+                    "CLOUDFLARE",
+                    (await response.text())[:200],
+                    response.status,
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+    except ProviderError:
+        raise
     except Exception:
         log_exception()
         return None
 
 
-async def llm_prompt(messages: List[Dict[str, str]]) -> str:
-    """Tenta provedores de LLM em ordem de prioridade."""
-    providers = [
-        ("GOOGLE AISTUDIO", google_aistudio_request),
-        ("GROQ", groq_request),
-        ("CLOUDFLARE", cloudflare_request),
+# --- Funções de Streaming ---
+async def _iter_sse_data(response) -> AsyncIterator[str]:
+    """Lê um corpo Server-Sent Events e devolve o conteúdo de cada linha `data:`."""
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            return
+        yield data
+
+
+async def _raise_for_provider_status(provider: str, response):
+    if response.status != 200:
+        raise ProviderError(
+            provider,
+            (await response.text())[:200],
+            response.status,
+            parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+async def google_aistudio_stream(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    model = get_google_model()
+    if not model:
+        raise ProviderNotConfiguredError("GOOGLE AISTUDIO", "chave não configurada")
+    google_formatted_messages = [
+        {"role": msg["role"], "parts": [msg["content"]]} for msg in messages
     ]
+    try:
+        response = await model.generate_content_async(
+            google_formatted_messages, stream=True
+        )
+        async for chunk in response:
+            # Trechos sem partes (ex.: só metadados de segurança) não têm `text`.
+            if chunk.parts:
+                yield chunk.text
+    except Exception as e:
+        status = getattr(e, "code", None)
+        if isinstance(status, int):
+            raise ProviderError("GOOGLE AISTUDIO", str(e)[:200], status) from e
+        raise
 
-    for name, func in providers:
-        try:
-            response = await func(messages)
-            if response:
-                print(f"Usado com sucesso: {name}")
-                return response.strip("`").strip()
-            else:
-                print(f"Falha com o provedor: {name}. Tentando o próximo...")
-                continue
-        except Exception:
-            log_exception()
-            print(f"Exceção com o provedor: {name}. Tentando o próximo...")
-            continue
+
+async def groq_stream(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    headers = get_groq_headers()
+    if not headers:
+        raise ProviderNotConfiguredError("GROQ", "chave não configurada")
+
+    async with provider_sessions.post(
+        GROQ,
+        "https://api.groq.com/openai/v1/chat/completions",
+        headers=headers,
+        json={"model": _groq_model(), "messages": messages, "stream": True},
+    ) as response:
+        await _raise_for_provider_status("GROQ", response)
+        async for data in _iter_sse_data(response):
+            delta = json.loads(data)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+
+async def cloudflare_stream(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    headers = get_cloudflare_headers()
+    account_id = os.environ.get("CLOUDFLARE_ACCOUNT_ID")
+
+    if not headers or not account_id:
+        raise ProviderNotConfiguredError("CLOUDFLARE", "chave ou conta não configurada")
+
+    model = "@cf/meta/llama-3-8b-instruct"
+
+    async with provider_sessions.post(
+        CLOUDFLARE,
+        f"https://api.cloudflare.com/client/v4/accounts/{account_id}/ai/run/{model}",
+        headers=headers,
+        json={"messages": messages, "stream": True},
+    ) as response:
+        await _raise_for_provider_status("CLOUDFLARE", response)
+        async for data in _iter_sse_data(response):
+            token = json.loads(data).get("response")
+            if token:
+                yield token
+
+
+PROVIDERS = [
+    ("GOOGLE AISTUDIO", google_aistudio_request),
+    ("GROQ", groq_request),
+    ("CLOUDFLARE", cloudflare_request),
+]
+
+llm_router = LLMRouter(
+    providers=PROVIDERS,
+    stream_providers={
+        "GOOGLE AISTUDIO": google_aistudio_stream,
+        "GROQ": groq_stream,
+        "CLOUDFLARE": cloudflare_stream,
+    },
+    breakers={
+        name: CircuitBreaker(
+            name,
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            cooldown=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+            max_cooldown=settings.LLM_BREAKER_MAX_COOLDOWN_SECONDS,
+        )
+        for name, _ in PROVIDERS
+    },
+    unconfigured_cooldown=settings.LLM_BREAKER_MAX_COOLDOWN_SECONDS,
+    alpha=settings.LLM_ROUTER_EWMA_ALPHA,
+    hedging=settings.LLM_HEDGING_ENABLED,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+    hedge_max_delay=settings.LLM_HEDGE_MAX_DELAY_SECONDS,
+)
+
+
+async def llm_prompt(messages: List[Dict[str, str]]) -> str:
+    """Envia o prompt ao provedor mais rápido e saudável, com hedge opcional."""
+    result = await llm_router.route(messages)
+    if result:
+        name, response = result
+        print(f"Usado com sucesso: {name}")
+        return response.strip("`").strip()
 
     print("Todos os provedores de LLM falharam.")
-    return "Ocorreu um erro na geração da narrativa. Tente novamente mais tarde."
+    return LLM_FAILURE_MESSAGE
+
+
+async def llm_prompt_stream(messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+    """Transmite a resposta da LLM trecho a trecho, com failover antes do 1º trecho."""
+    emitted = False
+    async for token in llm_router.stream(messages):
+        emitted = True
+        yield token
+
+    if not emitted:
+        print("Todos os provedores de LLM falharam.")
+        yield LLM_FAILURE_MESSAGE
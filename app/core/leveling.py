@@ -2,6 +2,8 @@ import math
 
 XP_BASE = 100
 XP_FACTOR = 1.5
+# Pontos somados a cada atributo a cada nível ganho
+ATTRIBUTE_POINTS_PER_LEVEL = 2
 
 
 def get_xp_for_next_level(level: int) -> int:
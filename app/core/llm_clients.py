@@ -0,0 +1,108 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+from app.core.config import settings
+
+GROQ = "groq"
+CLOUDFLARE = "cloudflare"
+PROVIDERS = (GROQ, CLOUDFLARE)
+
+
+class ProviderSessions:
+    """
+    Mantém uma `aiohttp.ClientSession` de longa duração por provedor de LLM,
+    reaproveitando conexões (keep-alive) e o cache de DNS entre as chamadas.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._stats: Dict[str, Dict[str, int]] = {
+            name: {"requests": 0, "in_flight": 0, "errors": 0} for name in PROVIDERS
+        }
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=settings.LLM_HTTP_POOL_SIZE,
+            limit_per_host=settings.LLM_HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.LLM_HTTP_KEEPALIVE_SECONDS,
+            use_dns_cache=True,
+            ttl_dns_cache=settings.LLM_HTTP_DNS_TTL_SECONDS,
+            enable_cleanup_closed=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings.LLM_HTTP_TIMEOUT_SECONDS,
+            connect=settings.LLM_HTTP_CONNECT_TIMEOUT_SECONDS,
+        )
+        headers = {}
+        if settings.LLM_HTTP_COMPRESSION:
+            headers["Accept-Encoding"] = "gzip, deflate"
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers=headers,
+            auto_decompress=True,
+            version=aiohttp.HttpVersion11,
+            raise_for_status=False,
+        )
+
+    async def start(self):
+        """Cria as sessões de todos os provedores (chamado no lifespan)."""
+        for name in PROVIDERS:
+            self.get(name)
+
+    def get(self, provider: str) -> aiohttp.ClientSession:
+        """Retorna a sessão do provedor, criando-a se ainda não existir."""
+        session = self._sessions.get(provider)
+        if session is None or session.closed:
+            session = self._create_session()
+            self._sessions[provider] = session
+        return session
+
+    @asynccontextmanager
+    async def post(
+        self, provider: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Faz um POST pela sessão do provedor, contabilizando o uso do pool."""
+        stats = self._stats[provider]
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        try:
+            async with self.get(provider).post(url, **kwargs) as response:
+                yield response
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+
+    async def close(self):
+        """Fecha todas as sessões (chamado no encerramento da aplicação)."""
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estatísticas de uso do pool de conexões de cada provedor."""
+        result = {}
+        for name in PROVIDERS:
+            session: Optional[aiohttp.ClientSession] = self._sessions.get(name)
+            connector = session.connector if session and not session.closed else None
+            # O aiohttp não expõe contadores públicos de conexões em uso ou ociosas.
+            in_use = len(getattr(connector, "_acquired", ()))
+            idle = sum(len(c) for c in getattr(connector, "_conns", {}).values())
+            limit = connector.limit if connector else settings.LLM_HTTP_POOL_SIZE
+            result[name] = {
+                **self._stats[name],
+                "open": connector is not None,
+                "limit": limit,
+                "connections_in_use": in_use,
+                "connections_idle": idle,
+                "utilization": in_use / limit if limit else 0.0,
+            }
+        return result
+
+
+provider_sessions = ProviderSessions()
@@ -0,0 +1,312 @@
+import asyncio
+import time
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from app.core.circuit_breaker import (
+    CircuitBreaker,
+    ProviderError,
+    ProviderNotConfiguredError,
+)
+from app.core.log_util import log_exception
+
+ProviderFunc = Callable[[List[Dict[str, str]]], Awaitable[Optional[str]]]
+StreamFunc = Callable[[List[Dict[str, str]]], AsyncIterator[str]]
+
+
+class ProviderStats:
+    """Latência (EWMA e amostras recentes) e taxa de erro de um provedor."""
+
+    def __init__(self, alpha: float, window: int = 100):
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency: float, success: bool):
+        self.calls += 1
+        failure = 0.0 if success else 1.0
+        self.error_rate = self.alpha * failure + (1 - self.alpha) * self.error_rate
+        if success:
+            self._latencies.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = (
+                    self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+                )
+        else:
+            self.failures += 1
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def score(self) -> float:
+        """
+        Custo esperado da chamada. Provedores nunca usados têm custo zero (são
+        explorados primeiro) e os que nunca responderam vão para o fim da fila.
+        """
+        if self.ewma_latency is None:
+            return 0.0 if self.calls == 0 else float("inf")
+        return self.ewma_latency / max(1.0 - self.error_rate, 0.05)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 4),
+            "ewma_latency": self.ewma_latency,
+            "p95_latency": self.percentile(0.95),
+        }
+
+
+class LLMRouter:
+    """
+    Ordena os provedores pela latência e taxa de erro observadas e, opcionalmente,
+    dispara uma requisição de "hedge" para o próximo provedor quando o atual
+    demora mais que o seu p95. A primeira resposta válida vence e as demais
+    chamadas são canceladas. Provedores com o disjuntor aberto são ignorados.
+    """
+
+    def __init__(
+        self,
+        providers: List[Tuple[str, ProviderFunc]],
+        stream_providers: Optional[Dict[str, StreamFunc]] = None,
+        breakers: Optional[Dict[str, CircuitBreaker]] = None,
+        unconfigured_cooldown: float = 600.0,
+        alpha: float = 0.2,
+        hedging: bool = True,
+        hedge_min_delay: float = 1.0,
+        hedge_max_delay: float = 10.0,
+        hedge_min_samples: int = 5,
+    ):
+        self.providers = providers
+        self.stream_providers = stream_providers or {}
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.stats = {name: ProviderStats(alpha) for name, _ in providers}
+        self.breakers = breakers or {
+            name: CircuitBreaker(name) for name, _ in providers
+        }
+        self.unconfigured_cooldown = unconfigured_cooldown
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        # Chamadas em andamento (route/stream); zero quando ocioso
+        self.in_flight = 0
+
+    def ordered(self) -> List[Tuple[str, ProviderFunc]]:
+        """
+        Provedores disponíveis do menor para o maior custo esperado
+        (empate: ordem original).
+        """
+        indexed = [
+            (index, provider)
+            for index, provider in enumerate(self.providers)
+            if self.breakers[provider[0]].available()
+        ]
+        indexed.sort(key=lambda item: (self.stats[item[1][0]].score(), item[0]))
+        return [provider for _, provider in indexed]
+
+    def hedge_delay(self, name: str) -> float:
+        stats = self.stats[name]
+        if stats.samples < self.hedge_min_samples:
+            return self.hedge_max_delay
+        p95 = stats.percentile(0.95)
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    def _record_error(self, name: str, error: Exception) -> bool:
+        """
+        Registra a falha no disjuntor do provedor. Retorna se ela deve contar
+        nas estatísticas de roteamento; só não conta quando o provedor não está
+        configurado, que fica fora da fila pelo cooldown de configuração.
+        """
+        breaker = self.breakers[name]
+        if isinstance(error, ProviderNotConfiguredError):
+            breaker.last_error = str(error)
+            breaker.trip(self.unconfigured_cooldown)
+            return False
+        if isinstance(error, ProviderError):
+            print(f"Erro no provedor {error} (status {error.status})")
+            breaker.last_error = str(error)
+            if error.auth_failed:
+                # Chave inválida ou revogada: tratada como provedor não configurado.
+                breaker.trip(self.unconfigured_cooldown)
+            elif not error.trips_breaker:
+                # O provedor respondeu: não abre o disjuntor, mas a taxa de erro
+                # sobe e ele desce na fila se falhar sempre.
+                breaker.release()
+            else:
+                breaker.record_failure(str(error), error.retry_after)
+        else:
+            log_exception()
+            breaker.record_failure(repr(error))
+        return True
+
+    async def _call(
+        self, name: str, func: ProviderFunc, messages: List[Dict[str, str]]
+    ) -> Optional[str]:
+        breaker = self.breakers[name]
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await func(messages)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not self._record_error(name, e):
+                return None
+        else:
+            if response:
+                breaker.record_success()
+            else:
+                breaker.record_failure("resposta vazia")
+        self.stats[name].record(time.perf_counter() - started, bool(response))
+        return response
+
+    def idle(self) -> bool:
+        return self.in_flight == 0
+
+    async def route(self, messages: List[Dict[str, str]]) -> Optional[Tuple[str, str]]:
+        """Retorna `(provedor, resposta)` do primeiro provedor que responder."""
+        self.in_flight += 1
+        try:
+            return await self._route(messages)
+        finally:
+            self.in_flight -= 1
+
+    async def _route(self, messages: List[Dict[str, str]]) -> Optional[Tuple[str, str]]:
+        queue = self.ordered()
+        pending: Dict[asyncio.Task, str] = {}
+        hedged: set = set()
+
+        def launch(is_hedge: bool = False) -> Optional[str]:
+            while queue:
+                name, func = queue.pop(0)
+                if not self.breakers[name].acquire():
+                    continue
+                task = asyncio.create_task(self._call(name, func, messages))
+                pending[task] = name
+                if is_hedge:
+                    hedged.add(name)
+                    self.hedges_fired += 1
+                return name
+            return None
+
+        current = launch()
+        try:
+            while pending:
+                # Só dispara hedge quando há um único provedor em andamento.
+                timeout = None
+                if self.hedging and queue and len(pending) == 1:
+                    timeout = self.hedge_delay(current)
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    print(f"Provedor {current} lento. Disparando hedge...")
+                    current = launch(is_hedge=True) or current
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    response = task.result()
+                    if response:
+                        if name in hedged:
+                            self.hedges_won += 1
+                        return name, response
+                    print(f"Falha com o provedor: {name}. Tentando o próximo...")
+
+                if pending:
+                    current = next(iter(pending.values()))
+                elif queue:
+                    current = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return None
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """
+        Transmite a resposta do primeiro provedor disponível, trecho a trecho.
+        Só há troca de provedor antes do primeiro trecho; depois disso uma falha
+        apenas encerra o fluxo.
+        """
+        self.in_flight += 1
+        try:
+            async for token in self._stream(messages):
+                yield token
+        finally:
+            self.in_flight -= 1
+
+    async def _stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        for name, _ in self.ordered():
+            stream_func = self.stream_providers.get(name)
+            breaker = self.breakers[name]
+            if stream_func is None or not breaker.acquire():
+                continue
+
+            started = time.perf_counter()
+            first_token_at = None
+            try:
+                async for token in stream_func(messages):
+                    if not token:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield token
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.release()
+                raise
+            except Exception as e:
+                if self._record_error(name, e):
+                    self.stats[name].record(time.perf_counter() - started, False)
+                if first_token_at is not None:
+                    return
+                print(f"Falha com o provedor: {name}. Tentando o próximo...")
+                continue
+
+            if first_token_at is None:
+                breaker.record_failure("resposta vazia")
+                self.stats[name].record(time.perf_counter() - started, False)
+                continue
+
+            breaker.record_success()
+            # Para o roteamento, o que importa no streaming é o tempo até o 1º trecho.
+            self.stats[name].record(first_token_at - started, True)
+            print(f"Usado com sucesso (streaming): {name}")
+            return
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "order": [name for name, _ in self.ordered()],
+            "hedging": self.hedging,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "in_flight": self.in_flight,
+            "providers": {name: s.snapshot() for name, s in self.stats.items()},
+            "breakers": {name: b.snapshot() for name, b in self.breakers.items()},
+        }
@@ -1,12 +1,21 @@
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Optional, Tuple, Union
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.executors import get_password_executor
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max iguais ao custo configurado: qualquer hash com outro custo precisa
+# ser refeito (ver `verify_and_update_password`).
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 ALGORITHM = "HS256"
 
@@ -31,3 +40,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verifica a senha e, se o hash usar outro custo, devolve um novo hash."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# Versões assíncronas: o bcrypt leva centenas de ms de CPU, então roda no
+# executor de senhas em vez de travar o event loop.
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await get_password_executor().run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return await get_password_executor().run(
+        verify_and_update_password, plain_password, hashed_password
+    )
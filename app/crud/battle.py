@@ -1,15 +1,46 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
+FINISHED_STATUS = "concluído"
+
+
+async def _find_with_history_window(
+    db: AsyncIOMotorDatabase,
+    query: Dict[str, Any],
+    history_tail: int,
+    sort: Optional[Dict[str, int]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca um estado de batalha trazendo apenas as últimas `history_tail`
+    entradas do histórico (nenhuma se for 0) e o tamanho total em `history_length`.
+    """
+    pipeline: List[Dict[str, Any]] = [{"$match": query}]
+    if sort:
+        pipeline.append({"$sort": sort})
+    pipeline.append({"$limit": 1})
+    history = {"$ifNull": ["$history", []]}
+    window: Dict[str, Any] = {"history_length": {"$size": history}}
+    if history_tail:
+        window["history"] = {"$slice": [history, -history_tail]}
+    pipeline.append({"$set": window})
+    if not history_tail:
+        pipeline.append({"$unset": "history"})
+    docs = await db.battle_states.aggregate(pipeline).to_list(1)
+    return docs[0] if docs else None
+
 
 async def get_battle_state(
-    db: AsyncIOMotorDatabase, character_id: str, battle_id: str
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    history_tail: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
-    return await db.battle_states.find_one(
-        {"character_id": character_id, "battle_id": battle_id}
-    )
+    query = {"character_id": character_id, "battle_id": battle_id}
+    if history_tail is not None:
+        return await _find_with_history_window(db, query, history_tail)
+    return await db.battle_states.find_one(query)
 
 
 async def get_battle_state_by_id(
@@ -19,19 +50,59 @@ async def get_battle_state_by_id(
 
 
 async def get_battle_state_by_character_and_user(
-    db: AsyncIOMotorDatabase, character_id: str, battle_id: str, user_id: str
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    user_id: str,
+    history_tail: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
-    return await db.battle_states.find_one(
-        {"character_id": character_id, "battle_id": battle_id, "user_id": user_id}
-    )
+    query = {"character_id": character_id, "battle_id": battle_id, "user_id": user_id}
+    if history_tail is not None:
+        return await _find_with_history_window(db, query, history_tail)
+    return await db.battle_states.find_one(query)
 
 
 async def get_most_recent_battle_state(
-    db: AsyncIOMotorDatabase, character_id: str, user_id: str
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    user_id: str,
+    history_tail: Optional[int] = None,
 ) -> Optional[Dict[str, Any]]:
-    return await db.battle_states.find_one(
-        {"character_id": character_id, "user_id": user_id}, sort=[("last_updated", -1)]
-    )
+    query = {"character_id": character_id, "user_id": user_id}
+    if history_tail is not None:
+        return await _find_with_history_window(
+            db, query, history_tail, sort={"last_updated": -1}
+        )
+    return await db.battle_states.find_one(query, sort=[("last_updated", -1)])
+
+
+async def get_battle_history_page(
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    user_id: Optional[str],
+    offset: int,
+    limit: int,
+) -> Optional[Dict[str, Any]]:
+    """Retorna uma página do histórico (a partir de `offset`) e o tamanho total."""
+    query = {"character_id": character_id, "battle_id": battle_id}
+    if user_id is not None:
+        query["user_id"] = user_id
+    history = {"$ifNull": ["$history", []]}
+    docs = await db.battle_states.aggregate(
+        [
+            {"$match": query},
+            {"$limit": 1},
+            {
+                "$project": {
+                    "_id": 0,
+                    "history": {"$slice": [history, offset, limit]},
+                    "history_length": {"$size": history},
+                }
+            },
+        ]
+    ).to_list(1)
+    return docs[0] if docs else None
 
 
 async def save_battle_state(db: AsyncIOMotorDatabase, battle_state: Dict[str, Any]):
@@ -46,6 +117,64 @@ async def save_battle_state(db: AsyncIOMotorDatabase, battle_state: Dict[str, An
     )
 
 
+async def append_battle_turn(
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    entries: List[Dict[str, str]],
+    player_damage: int = 0,
+    enemy_damage: int = 0,
+    status: Optional[str] = None,
+    expected_length: Optional[int] = None,
+) -> bool:
+    """
+    Acrescenta as falas ao histórico e aplica o dano (e o status, se houver)
+    numa única operação atômica, sem reescrever o documento. Retorna se a
+    batalha existe e, com `expected_length`, se o histórico ainda tinha esse
+    tamanho (nenhum outro turno foi gravado desde a leitura).
+    """
+    fields: Dict[str, Any] = {"last_updated": datetime.utcnow().isoformat()}
+    if status is not None:
+        fields["status"] = status
+    query: Dict[str, Any] = {"character_id": character_id, "battle_id": battle_id}
+    if expected_length is not None:
+        query["$expr"] = {
+            "$eq": [{"$size": {"$ifNull": ["$history", []]}}, expected_length]
+        }
+    result = await db.battle_states.update_one(
+        query,
+        {
+            "$push": {"history": {"$each": entries}},
+            "$inc": {"player_health": -player_damage, "enemy_health": -enemy_damage},
+            "$set": fields,
+        },
+    )
+    return result.matched_count == 1
+
+
+async def update_battle_summary(
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    summary: str,
+    summarized_until: int,
+    previous_until: int,
+) -> bool:
+    """
+    Grava o resumo acumulado do histórico até `summarized_until`, só se
+    ninguém o tiver atualizado desde `previous_until`.
+    """
+    result = await db.battle_states.update_one(
+        {
+            "character_id": character_id,
+            "battle_id": battle_id,
+            "summarized_until": previous_until or {"$in": [0, None]},
+        },
+        {"$set": {"history_summary": summary, "summarized_until": summarized_until}},
+    )
+    return result.modified_count == 1
+
+
 async def delete_battle_state(
     db: AsyncIOMotorDatabase, character_id: str, battle_id: str
 ):
@@ -0,0 +1,180 @@
+"""
+Índices do MongoDB usados pelas consultas do CRUD.
+
+`ensure_indexes` é chamado no lifespan da API e é idempotente. Para conferir os
+planos de execução das consultas (falha se alguma fizer COLLSCAN):
+
+    python -m app.crud.indexes
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.core import database
+from app.core.log_util import log_exception
+from app.crud.battle import FINISHED_STATUS
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [IndexModel([("email", ASCENDING)], unique=True, name="email_unique")],
+    "characters": [IndexModel([("user_id", ASCENDING)], name="user_id")],
+    "battle_states": [
+        IndexModel(
+            [("character_id", ASCENDING), ("battle_id", ASCENDING)],
+            unique=True,
+            name="character_battle_unique",
+        ),
+        IndexModel(
+            [
+                ("character_id", ASCENDING),
+                ("user_id", ASCENDING),
+                ("last_updated", DESCENDING),
+            ],
+            name="character_user_last_updated",
+        ),
+        # Compactação de memória: batalhas concluídas por personagem, em ordem.
+        IndexModel(
+            [
+                ("status", ASCENDING),
+                ("character_id", ASCENDING),
+                ("last_updated", ASCENDING),
+            ],
+            name="status_character_last_updated",
+        ),
+        # Compactação de memória: batalhas concluídas depois da marca d'água global.
+        IndexModel(
+            [("status", ASCENDING), ("last_updated", ASCENDING)],
+            name="status_last_updated",
+        ),
+    ],
+    # Invalidações do cache de usuários entre workers; expiram sozinhas.
+    "user_cache_invalidations": [
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=3600, name="at_ttl")
+    ],
+    # Descargas da camada quente de memórias entre workers; expiram sozinhas.
+    "hot_memory_invalidations": [
+        IndexModel([("at", ASCENDING)], expireAfterSeconds=3600, name="at_ttl")
+    ],
+    "memory_compaction": [
+        IndexModel([("character_id", ASCENDING)], unique=True, name="character_unique")
+    ],
+}
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """Cria os índices que faltarem. Falhas (ex.: duplicatas) são registradas."""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure:
+            log_exception()
+
+
+# --- Verificação dos planos de execução ---
+
+
+def _query_plans(db: AsyncIOMotorDatabase) -> List[Tuple[str, Any]]:
+    """Uma amostra de cada consulta feita pelo CRUD, como chamada de explain."""
+    object_id = ObjectId()
+    battle = {"character_id": "c", "battle_id": "b"}
+    return [
+        ("users por email", db.users.find({"email": "x"}).limit(1).explain()),
+        ("characters por _id", db.characters.find({"_id": object_id}).explain()),
+        ("characters por user_id", db.characters.find({"user_id": "u"}).explain()),
+        ("battle_states por batalha", db.battle_states.find(battle).explain()),
+        (
+            "battle_states por batalha e usuário",
+            db.battle_states.find({**battle, "user_id": "u"}).explain(),
+        ),
+        (
+            "battle_states mais recente",
+            db.battle_states.find({"character_id": "c", "user_id": "u"})
+            .sort("last_updated", DESCENDING)
+            .limit(1)
+            .explain(),
+        ),
+        (
+            "battle_states janela do histórico",
+            db.command(
+                {
+                    "aggregate": "battle_states",
+                    "pipeline": [{"$match": battle}, {"$limit": 1}],
+                    "explain": True,
+                }
+            ),
+        ),
+        (
+            "battle_states concluídas após a marca d'água",
+            db.battle_states.find(
+                {"status": FINISHED_STATUS, "last_updated": {"$gt": ""}},
+                {"character_id": 1, "last_updated": 1},
+            )
+            .sort("last_updated", ASCENDING)
+            .limit(1)
+            .explain(),
+        ),
+        (
+            "battle_states concluídas por personagem",
+            db.battle_states.find(
+                {
+                    "character_id": "c",
+                    "status": FINISHED_STATUS,
+                    "last_updated": {"$gt": ""},
+                }
+            )
+            .sort("last_updated", ASCENDING)
+            .explain(),
+        ),
+        (
+            "user_cache_invalidations recentes",
+            db.user_cache_invalidations.find(
+                {"at": {"$gte": datetime.utcnow()}}
+            ).explain(),
+        ),
+        (
+            "hot_memory_invalidations recentes",
+            db.hot_memory_invalidations.find(
+                {"at": {"$gte": datetime.utcnow()}}
+            ).explain(),
+        ),
+        (
+            "memory_compaction por personagem",
+            db.memory_compaction.find({"character_id": "c"}).limit(1).explain(),
+        ),
+    ]
+
+
+async def check_query_plans(db: AsyncIOMotorDatabase) -> List[str]:
+    """Executa explain em cada consulta e devolve as que fariam COLLSCAN."""
+    failures = []
+    for name, explain in _query_plans(db):
+        plan = json.dumps(await explain, default=str)
+        collscan = "COLLSCAN" in plan
+        print(f"{'COLLSCAN' if collscan else 'ok':8} {name}")
+        if collscan:
+            failures.append(name)
+    return failures
+
+
+async def main() -> int:
+    try:
+        db = database.connect()
+        await ensure_indexes(db)
+        failures = await check_query_plans(db)
+    finally:
+        database.close()
+    if failures:
+        print(f"{len(failures)} consulta(s) sem índice: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -1,7 +1,9 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from app.core.security import get_password_hash
+from app.core import auth_cache
+from app.core.security import get_password_hash_async
 from app.schemas.user import UserCreate, UserUpdate
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 
 async def get_user_by_email(db: AsyncIOMotorDatabase, email: str):
@@ -9,7 +11,7 @@ async def get_user_by_email(db: AsyncIOMotorDatabase, email: str):
 
 
 async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     user_data = user.model_dump()
     user_data["hashed_password"] = hashed_password
     del user_data["password"]
@@ -21,14 +23,41 @@ async def create_user(db: AsyncIOMotorDatabase, user: UserCreate):
 async def update_user(db: AsyncIOMotorDatabase, user_id: str, user_update: UserUpdate):
     update_data = user_update.model_dump(exclude_unset=True)
     if "password" in update_data and update_data["password"]:
-        update_data["hashed_password"] = get_password_hash(update_data["password"])
+        update_data["hashed_password"] = await get_password_hash_async(
+            update_data["password"]
+        )
         del update_data["password"]
     if update_data:
-        await db.users.update_one({"_id": ObjectId(user_id)}, {"$set": update_data})
-    updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
-    return updated_user
+        # O documento anterior informa o email antigo, que também sai do cache.
+        previous_user = await db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if previous_user is None:
+            return None
+        auth_cache.invalidate_user(previous_user["email"])
+        if update_data.get("email", previous_user["email"]) != previous_user["email"]:
+            auth_cache.invalidate_user(update_data["email"])
+        return {**previous_user, **update_data}
+    return await db.users.find_one({"_id": ObjectId(user_id)})
 
 
 async def delete_user(db: AsyncIOMotorDatabase, user_id: str):
-    delete_result = await db.users.delete_one({"_id": ObjectId(user_id)})
-    return delete_result.deleted_count > 0
+    deleted_user = await db.users.find_one_and_delete({"_id": ObjectId(user_id)})
+    if deleted_user:
+        auth_cache.invalidate_user(deleted_user["email"])
+    return deleted_user is not None
+
+
+async def update_password_hash(
+    db: AsyncIOMotorDatabase, user_id, previous_hash: str, new_hash: str
+):
+    """Troca o hash da senha (rehash no login), se ele não mudou nesse meio tempo."""
+    result = await db.users.find_one_and_update(
+        {"_id": user_id, "hashed_password": previous_hash},
+        {"$set": {"hashed_password": new_hash}},
+        projection={"email": 1},
+    )
+    if result:
+        auth_cache.invalidate_user(result["email"])
@@ -1,27 +1,98 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from app.core import auth_cache, database
 from app.core.config import settings
+from app.core.executors import shutdown_executors
+from app.core.llm_clients import provider_sessions
+from app.core.log_util import log_exception
 from app.api.v1.router import api_router
+from app.crud.indexes import ensure_indexes
+from app.services import battle_session, llm_service
+from app.services.memory_compaction import HotMemoryInvalidation, memory_compactor
+
+
+async def warmup_models():
+    """Carrega os modelos em segundo plano; a prontidão é exposta em /health/ready."""
+    try:
+        await llm_service.warmup_async()
+        print("Modelos de IA carregados.")
+    except Exception:
+        log_exception()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Cliente único do MongoDB, usado também por deps.get_db
+    app.mongodb = database.connect()
+    if settings.MONGO_ENSURE_INDEXES:
+        try:
+            await ensure_indexes(app.mongodb)
+        except Exception:
+            log_exception()
+    await provider_sessions.start()
+
+    background_tasks = []
+    if settings.WARMUP_ON_STARTUP:
+        background_tasks.append(asyncio.create_task(warmup_models()))
+    if settings.OPENING_POOL_ENABLED:
+        llm_service.opening_pool.start()
+        background_tasks.append(
+            asyncio.create_task(
+                llm_service.opening_pool.prime_from_db(
+                    app.mongodb,
+                    settings.OPENING_POOL_THEMES,
+                    settings.OPENING_POOL_TOP_COMBINATIONS,
+                )
+            )
+        )
+
+    if settings.MEMORY_COMPACTION_ENABLED:
+        memory_compactor.start(app.mongodb)
+    user_invalidation = None
+    if settings.AUTH_CACHE_INVALIDATION_POLL_SECONDS > 0:
+        user_invalidation = auth_cache.MongoUserInvalidation(
+            app.mongodb, settings.AUTH_CACHE_INVALIDATION_POLL_SECONDS
+        )
+        user_invalidation.start()
+    hot_memory_invalidation = None
+    if (
+        settings.MEMORY_HOT_TIER_ENABLED
+        and settings.MEMORY_HOT_TIER_INVALIDATION_POLL_SECONDS > 0
+    ):
+        hot_memory_invalidation = HotMemoryInvalidation(
+            app.mongodb, settings.MEMORY_HOT_TIER_INVALIDATION_POLL_SECONDS
+        )
+        hot_memory_invalidation.start()
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+    await llm_service.opening_pool.stop()
+    await memory_compactor.stop()
+    await battle_session.flush_sessions()
+    if user_invalidation is not None:
+        await user_invalidation.stop()
+    if hot_memory_invalidation is not None:
+        await hot_memory_invalidation.stop()
+    await llm_service.interaction_buffer.close()
+    await llm_service.rerank_batcher.close()
+    await provider_sessions.close()
+    database.close()
+    shutdown_executors()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
     description="API para RPG Textual com IA",
+    lifespan=lifespan,
 )
 
 
-@app.on_event("startup")
-async def startup_db_client():
-    app.mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
-    app.mongodb = app.mongodb_client[settings.DB_NAME]
-
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    app.mongodb_client.close()
-
-
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
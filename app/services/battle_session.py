@@ -0,0 +1,183 @@
+import asyncio
+import weakref
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.log_util import log_exception
+from app.crud import battle as crud_battle
+from app.services import prompt_budget
+
+
+class BattleSession:
+    """
+    Estado de uma batalha mantido pela conexão websocket que a conduz.
+
+    O personagem e o estado (com o fim do histórico) são lidos uma vez; cada
+    turno é aplicado em memória e o delta (falas, dano e status) é gravado em
+    segundo plano. Deltas de turnos que chegam enquanto uma gravação está em
+    curso são agrupados na seguinte, então cada turno custa no máximo uma
+    escrita pequena no MongoDB.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        character_id: str,
+        battle_id: str,
+        character: Dict[str, Any],
+        state: Dict[str, Any],
+    ):
+        self.db = db
+        self.character_id = character_id
+        self.battle_id = battle_id
+        self.character = character
+        self.state = state
+        self.state.setdefault("history", [])
+        self.state.setdefault("history_length", len(self.state["history"]))
+        self._entries: List[Dict[str, str]] = []
+        self._player_damage = 0
+        self._enemy_damage = 0
+        self._status: Optional[str] = None
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        _sessions.add(self)
+
+    @property
+    def battle_theme(self) -> str:
+        return self.state.get("battle_theme", "")
+
+    @property
+    def finished(self) -> bool:
+        return self.state.get("status") == crud_battle.FINISHED_STATUS
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._entries or self._status)
+
+    def history_window(self) -> Tuple[str, List[str], int]:
+        return prompt_budget.history_window(self.state)
+
+    def apply_turn(
+        self,
+        entries: List[Dict[str, str]],
+        player_damage: int = 0,
+        enemy_damage: int = 0,
+    ) -> Dict[str, Any]:
+        """Aplica o turno ao estado em memória e enfileira o delta para gravação."""
+        state = self.state
+        state["history"] = (state["history"] + entries)[-settings.BATTLE_HISTORY_TAIL :]
+        state["history_length"] += len(entries)
+        state["player_health"] = state.get("player_health", 0) - player_damage
+        state["enemy_health"] = state.get("enemy_health", 0) - enemy_damage
+        state["last_updated"] = datetime.utcnow().isoformat()
+
+        self._entries.extend(entries)
+        self._player_damage += player_damage
+        self._enemy_damage += enemy_damage
+        if not self.finished and (
+            state["player_health"] <= 0 or state["enemy_health"] <= 0
+        ):
+            state["status"] = self._status = crud_battle.FINISHED_STATUS
+        _stats["turns"] += 1
+        return state
+
+    def schedule_flush(self):
+        """Grava o delta pendente em segundo plano (fim do turno)."""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_in_background())
+
+    async def _flush_in_background(self):
+        try:
+            await self.flush()
+        except Exception:
+            log_exception()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.has_pending:
+                return
+            entries, self._entries = self._entries, []
+            player_damage, self._player_damage = self._player_damage, 0
+            enemy_damage, self._enemy_damage = self._enemy_damage, 0
+            status, self._status = self._status, None
+            try:
+                await crud_battle.append_battle_turn(
+                    self.db,
+                    self.character_id,
+                    self.battle_id,
+                    entries,
+                    player_damage=player_damage,
+                    enemy_damage=enemy_damage,
+                    status=status,
+                )
+            except Exception:
+                # Devolve o delta para a próxima gravação, antes dos turnos novos.
+                self._entries[:0] = entries
+                self._player_damage += player_damage
+                self._enemy_damage += enemy_damage
+                self._status = self._status or status
+                _stats["failures"] += 1
+                raise
+            _stats["writes"] += 1
+            _stats["entries_written"] += len(entries)
+
+    def discard(self):
+        """Descarta o delta pendente (a batalha vai ser apagada)."""
+        self._entries = []
+        self._player_damage = self._enemy_damage = 0
+        self._status = None
+
+    async def close(self):
+        """Grava o que estiver pendente e encerra a sessão (desconexão)."""
+        try:
+            await self.flush()
+        finally:
+            _sessions.discard(self)
+
+
+_sessions: "weakref.WeakSet[BattleSession]" = weakref.WeakSet()
+_stats = {"turns": 0, "writes": 0, "entries_written": 0, "failures": 0}
+
+
+async def load_session(
+    db: AsyncIOMotorDatabase,
+    character_id: str,
+    battle_id: str,
+    character: Dict[str, Any],
+    user_id: str,
+) -> Optional[BattleSession]:
+    """Abre a sessão a partir do estado salvo, ou None se a batalha não existir."""
+    state = await crud_battle.get_battle_state_by_character_and_user(
+        db,
+        character_id,
+        battle_id,
+        user_id,
+        history_tail=settings.BATTLE_HISTORY_TAIL,
+    )
+    if state is None:
+        return None
+    return BattleSession(db, character_id, battle_id, character, state)
+
+
+def has_live_session(character_id: str, battle_id: str) -> bool:
+    """Indica se a batalha está aberta num websocket deste worker."""
+    return any(
+        session.character_id == character_id and session.battle_id == battle_id
+        for session in list(_sessions)
+    )
+
+
+async def flush_sessions():
+    """Grava os deltas de todas as sessões abertas (encerramento da aplicação)."""
+    for session in list(_sessions):
+        try:
+            await session.flush()
+        except Exception:
+            log_exception()
+
+
+def stats() -> Dict[str, Any]:
+    return {"active": len(_sessions), **_stats}
@@ -0,0 +1,89 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+Encoder = Callable[[List[str]], Any]
+
+
+class EmbeddingCache:
+    """
+    Cache LRU de embeddings indexado pelo hash do texto e limitado em bytes.
+    Os vetores ficam guardados em float16 (ou float32) para ocupar menos memória
+    e são devolvidos sempre como float32. É seguro para uso entre threads.
+    """
+
+    def __init__(self, max_bytes: int, dtype: str = "float16"):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _store(self, key: str, vector: np.ndarray):
+        compact = np.ascontiguousarray(vector, dtype=self.dtype)
+        previous = self._data.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.nbytes
+        self._data[key] = compact
+        self._bytes += compact.nbytes
+        while self._bytes > self.max_bytes and self._data:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def encode(self, texts: List[str], encoder: Encoder) -> np.ndarray:
+        """
+        Devolve a matriz de embeddings dos textos, chamando `encoder` uma única
+        vez e apenas com os textos (distintos) que ainda não estão no cache.
+        """
+        keys = [self.key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        missing: Dict[str, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                cached = self._data.get(key)
+                if cached is not None:
+                    self._data.move_to_end(key)
+                    vectors[key] = cached
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = text
+                    self.misses += 1
+                else:
+                    # Texto repetido no mesmo lote: será calculado uma vez só.
+                    self.hits += 1
+
+        if missing:
+            encoded = np.asarray(encoder(list(missing.values())), dtype=np.float32)
+            with self._lock:
+                for key, vector in zip(missing, encoded):
+                    vectors[key] = vector
+                    self._store(key, vector)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "dtype": self.dtype.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
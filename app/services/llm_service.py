@@ -1,43 +1,211 @@
-import chromadb
-from chromadb import Documents, EmbeddingFunction, Embeddings
-from sentence_transformers import CrossEncoder
-from model2vec import StaticModel
+import asyncio
+import threading
+import time
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import re
-import random
-from app.core.free_llms import llm_prompt
-
-# --- Configuração do Modelo de Embedding ---
-embedding_model = StaticModel.from_pretrained(
-    "cnmoro/nomic-embed-text-v2-moe-distilled-high-quality"
+from app.core.combat import RoundOutcome
+from app.core.config import settings
+from app.core.database import get_chroma_client
+from app.core.free_llms import (
+    LLM_FAILURE_MESSAGE,
+    llm_prompt,
+    llm_prompt_stream,
+    llm_router,
+)
+from app.core.executors import (
+    ExecutorBusyError,
+    ExecutorTimeoutError,
+    get_inference_executor,
+)
+from app.core.log_util import log_exception
+from app.crud import battle as crud_battle
+from app.services.embedding_cache import EmbeddingCache
+from app.services.memory_index import HotMemoryIndex
+from app.services import prompt_budget
+from app.services.opening_pool import OpeningPool
+from app.services.rerank_batcher import RerankBatcher
+from app.services.response_cache import ResponseCache
+from app.services.suggestions import SpeculativeSuggestions
+
+EMBEDDING_MODEL_NAME = "cnmoro/nomic-embed-text-v2-moe-distilled-high-quality"
+RERANKER_MODEL_NAME = "jinaai/jina-reranker-v2-base-multilingual"
+RERANK_TOP_K = 5
+COLLECTION_NAME = "rpg_nexus_history"
+
+# --- Componentes Pesados (carregados sob demanda) ---
+# Os modelos e a conexão com o ChromaDB só são criados no primeiro uso ou no
+# aquecimento do lifespan, para que importar a API continue rápido.
+_embedding_model = None
+_collection = None
+_reranker = None
+_embedding_lock = threading.Lock()
+_collection_lock = threading.Lock()
+_reranker_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Carrega o modelo de embedding (model2vec), apenas uma vez."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                from model2vec import StaticModel
+
+                _embedding_model = StaticModel.from_pretrained(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+
+# Textos repetidos (consultas de contexto, inserções) não passam pelo modelo
+# duas vezes: consultas e escritas compartilham o mesmo cache.
+embedding_cache = EmbeddingCache(
+    max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+    dtype=settings.EMBEDDING_CACHE_DTYPE,
 )
 
 
-class EmbedDocuments(EmbeddingFunction):
-    def __call__(self, input: Documents) -> Embeddings:
-        return embedding_model.encode(input).tolist()
+def embed_texts(texts: List[str]):
+    """Calcula os embeddings de uma lista de textos, passando pelo cache."""
+    return embedding_cache.encode(texts, get_embedding_model().encode)
 
 
-# --- Conexão com o ChromaDB ---
-chroma_client = chromadb.HttpClient(host="localhost", port=8001)
-collection = chroma_client.get_or_create_collection(
-    name="rpg_nexus_history", embedding_function=EmbedDocuments()
-)
+class EmbedDocuments:
+    """Função de embedding do ChromaDB baseada no modelo model2vec."""
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return embed_texts(input).tolist()
+
+
+def get_collection():
+    """Abre a coleção de memórias no ChromaDB, apenas uma vez."""
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                _collection = get_chroma_client().get_or_create_collection(
+                    name=COLLECTION_NAME, embedding_function=EmbedDocuments()
+                )
+    return _collection
+
+
+def get_reranker():
+    """
+    Carrega o reranker, apenas uma vez.
+    Este modelo ajuda a encontrar os trechos de memória mais relevantes.
+    """
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                from sentence_transformers import CrossEncoder
+
+                reranker = CrossEncoder(RERANKER_MODEL_NAME, trust_remote_code=True)
+                if settings.RERANK_QUANTIZE_INT8:
+                    reranker = quantize_reranker(reranker)
+                _reranker = reranker
+    return _reranker
+
+
+_reranker_quantized = False
+
+
+def quantize_reranker(reranker):
+    """
+    Quantiza dinamicamente as camadas lineares do reranker para int8.
+    Só vale em CPU; em GPU ou em caso de erro o modelo original é mantido.
+    """
+    global _reranker_quantized
+    import torch
+
+    if torch.cuda.is_available():
+        return reranker
+    try:
+        reranker.model = torch.quantization.quantize_dynamic(
+            reranker.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        _reranker_quantized = True
+    except Exception:
+        log_exception()
+    return reranker
+
+
+# Confirmado pelo aquecimento no executor. Com executor de processos os modelos
+# ficam nos processos filhos, e as variáveis acima nunca mudam neste processo.
+_warmed_up = False
+
+
+def models_loaded() -> bool:
+    """Indica se todos os componentes pesados já foram carregados."""
+    return _warmed_up or all(
+        c is not None for c in (_embedding_model, _collection, _reranker)
+    )
+
+
+def warmup() -> bool:
+    """
+    Carrega todos os componentes e executa uma inferência mínima em cada um.
+    Devolve se o processo que executou ficou com tudo carregado.
+    """
+    get_embedding_model().encode(["aquecimento"])
+    get_collection()
+    get_reranker().predict([("aquecimento", "aquecimento")])
+    return models_loaded()
 
-# --- Configuração do Reranker ---
-# Este modelo ajuda a encontrar os trechos de memória mais relevantes
-reranker = CrossEncoder(
-    "jinaai/jina-reranker-v2-base-multilingual", trust_remote_code=True
+
+async def warmup_async():
+    """
+    Executa o aquecimento no executor de inferência. Com processos, envia um
+    aquecimento por worker ao mesmo tempo (cada um ocupa um processo enquanto
+    carrega os modelos) e só marca os modelos como prontos quando todos
+    confirmam.
+    """
+    global _warmed_up
+    executor = get_inference_executor()
+    runs = executor.max_workers if executor.kind == "process" else 1
+    results = await asyncio.gather(
+        *(
+            executor.run(warmup, timeout=settings.WARMUP_TIMEOUT_SECONDS)
+            for _ in range(runs)
+        )
+    )
+    _warmed_up = all(results)
+
+
+async def embed_texts_async(texts: List[str]):
+    """Calcula embeddings no executor de inferência."""
+    return await get_inference_executor().run(embed_texts, texts)
+
+
+# --- Cache de Respostas da LLM ---
+prompt_cache = ResponseCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl=settings.LLM_CACHE_TTL_SECONDS,
+    semantic_threshold=settings.LLM_CACHE_SEMANTIC_THRESHOLD,
+    embed=embed_texts_async,
 )
 
 
-def rerank_context(query: str, texts: List[str], top_k=5) -> List[str]:
-    """Reordena os textos baseados na relevância para a query."""
-    if not texts:
-        return []
-    rankings = reranker.rank(query, texts, return_documents=True)
-    return [r["text"] for r in rankings[:top_k]]
+async def cached_llm_prompt(
+    messages: List[Dict[str, str]], namespace: str, semantic: bool = False
+) -> str:
+    """
+    `llm_prompt` com cache de respostas. Cada ponto de chamada escolhe seu
+    namespace e se aceita respostas de prompts apenas semelhantes.
+
+    O modo semântico é opt-in e nenhuma chamada atual o usa. Ele compara o
+    prompt inteiro, quase todo texto fixo: só deve ser usado em prompts sem
+    dados de um usuário (personagem, memórias), ou a resposta de um jogador
+    pode ser servida a outro.
+    """
+    if not settings.LLM_CACHE_ENABLED:
+        return await llm_prompt(messages)
+    return await prompt_cache.get_or_compute(
+        namespace,
+        messages,
+        lambda: llm_prompt(messages),
+        semantic=semantic,
+        should_store=lambda response: response != LLM_FAILURE_MESSAGE,
+    )
 
 
 # --- Funções de Interação com a LLM ---
@@ -67,38 +235,85 @@ async def generate_initial_narrative(
     5. IMPORTANTE: Sua resposta deve ser APENAS a narrativa em texto puro. NÃO inclua títulos, marcadores ou qualquer texto que não seja parte da história (como "Cenário:", "O Inimigo:", etc.).
     """
     messages = [{"role": "user", "content": prompt}]
-    return await llm_prompt(messages)
+    return await cached_llm_prompt(messages, "initial_narrative")
 
 
-async def continue_narrative(
-    character: dict,
-    battle_theme: str,
-    history: List[str],
-    player_action: str,
-    memory: str,
-) -> str:
-    """Continua a narrativa e retorna um texto simples."""
-    history_str = "\n".join(history)
+async def generate_pooled_opening(
+    battle_theme: str, race: str, char_class: str
+) -> Optional[str]:
+    """
+    Gera uma abertura genérica para a reserva de aberturas prontas. Como ela
+    não conhece o personagem específico, o herói é tratado apenas por "você".
+    """
+    prompt = f"""
+    Você é um Mestre de RPG talentoso. Sua tarefa é iniciar uma batalha épica com uma narrativa envolvente e dinâmica, em um único texto contínuo.
 
-    player_damage = character["attributes"]["strength"] * random.randint(5, 10)
-    enemy_damage = random.randint(10, 20)
+    Herói: um(a) {race} da classe {char_class}.
 
-    # Simula um ataque especial
-    if "especial" in player_action.lower() or "habilidade" in player_action.lower():
-        player_damage *= 2
+    Tema da Batalha: "{battle_theme}"
+
+    Instruções:
+    1. Comece descrevendo o cenário de forma vívida.
+    2. Em seguida, introduza um inimigo que se encaixe no tema da batalha.
+    3. Termine a narrativa em um momento de tensão, preparando o jogador para sua primeira ação.
+    4. Sua narrativa deve ter exatamente 3 parágrafos.
+    5. Refira-se ao herói apenas como "você", sem inventar um nome para ele.
+    6. IMPORTANTE: Sua resposta deve ser APENAS a narrativa em texto puro. NÃO inclua títulos, marcadores ou qualquer texto que não seja parte da história (como "Cenário:", "O Inimigo:", etc.).
+    """
+    messages = [{"role": "user", "content": prompt}]
+    narrative = await llm_prompt(messages)
+    return None if narrative == LLM_FAILURE_MESSAGE else narrative
 
-    # Simula a chance de esquiva
-    player_dodge_chance = character["attributes"]["dexterity"] * 2
-    enemy_dodge_chance = 10
 
-    player_dodged = random.randint(1, 100) <= player_dodge_chance
-    enemy_dodged = random.randint(1, 100) <= enemy_dodge_chance
+opening_pool = OpeningPool(
+    generate=generate_pooled_opening,
+    size=settings.OPENING_POOL_SIZE,
+    max_keys=settings.OPENING_POOL_MAX_KEYS,
+    refill_interval=settings.OPENING_POOL_REFILL_INTERVAL_SECONDS,
+    themes=settings.OPENING_POOL_THEMES,
+    is_idle=llm_router.idle,
+)
 
-    if enemy_dodged:
-        player_damage = 0
 
-    if player_dodged:
-        enemy_damage = 0
+async def get_opening_narrative(
+    character: dict, character_id: str, battle_theme: str
+) -> str:
+    """
+    Usa uma abertura pronta da reserva quando houver; senão gera uma na hora,
+    com as memórias do personagem.
+    """
+    if settings.OPENING_POOL_ENABLED:
+        narrative = opening_pool.take(
+            battle_theme, character["race"], character["char_class"]
+        )
+        if narrative:
+            return narrative
+    memory = await retrieve_memory_async(character_id, battle_theme)
+    return await generate_initial_narrative(character, battle_theme, memory)
+
+
+def build_continue_messages(
+    character: dict,
+    battle_theme: str,
+    history: List[str],
+    player_action: str,
+    memory: str,
+    outcome: RoundOutcome,
+    history_summary: str = "",
+) -> List[Dict[str, str]]:
+    """
+    Monta o prompt de continuação da batalha com o resultado da rodada, já
+    resolvido pelo motor de combate. Cada seção (instruções, memórias e
+    histórico) respeita seu orçamento de tokens.
+    """
+    battle_theme, player_action = prompt_budget.fit_instructions(
+        battle_theme, player_action
+    )
+    memory = prompt_budget.truncate_tokens(memory, settings.PROMPT_MEMORY_TOKENS)
+    history_summary, history = prompt_budget.fit_history(history, history_summary)
+    history_str = "\n".join(history)
+    if history_summary:
+        history_str = f"Resumo dos turnos anteriores: {history_summary}\n{history_str}"
 
     prompt = f"""
     Você é um mestre de RPG. Sua tarefa é continuar a história de forma clara, dinâmica e que prenda a atenção do jogador.
@@ -119,10 +334,10 @@ async def continue_narrative(
     Ação do Jogador: "{player_action}"
 
     Cálculo da Rodada:
-    - Dano que o Jogador causa: {player_damage}
-    - Dano que o Inimigo causa: {enemy_damage}
-    - Jogador esquivou do golpe inimigo: {player_dodged}
-    - Inimigo esquivou do golpe do jogador: {enemy_dodged}
+    - Dano que o Jogador causa: {outcome.player_damage}
+    - Dano que o Inimigo causa: {outcome.enemy_damage}
+    - Jogador esquivou do golpe inimigo: {outcome.player_dodged}
+    - Inimigo esquivou do golpe do jogador: {outcome.enemy_dodged}
 
     Instruções de Resposta:
     1. Descreva o resultado da ação do jogador e, em seguida, a reação e o contra-ataque do inimigo.
@@ -130,14 +345,133 @@ async def continue_narrative(
     3. Seja conciso. A narrativa deve ter no máximo 3 frases.
     4. A sua resposta deve ser APENAS a narrativa em texto puro.
     5. NÃO inclua títulos como "Resultado da Ação do Jogador" ou "Reação do Inimigo". Apenas o texto corrido.
-    6. No final da sua resposta, adicione a seguinte linha especial, sem pular linha: `[DANO_CAUSADO:{player_damage},DANO_RECEBIDO:{enemy_damage}]`
     """
-    messages = [{"role": "user", "content": prompt}]
+    return [{"role": "user", "content": prompt}]
+
+
+async def continue_narrative(
+    character: dict,
+    battle_theme: str,
+    history: List[str],
+    player_action: str,
+    memory: str,
+    outcome: RoundOutcome,
+    history_summary: str = "",
+) -> str:
+    """Continua a narrativa e retorna um texto simples."""
+    messages = build_continue_messages(
+        character,
+        battle_theme,
+        history,
+        player_action,
+        memory,
+        outcome,
+        history_summary,
+    )
     return await llm_prompt(messages)
 
 
+async def continue_narrative_stream(
+    character: dict,
+    battle_theme: str,
+    history: List[str],
+    player_action: str,
+    memory: str,
+    outcome: RoundOutcome,
+    history_summary: str = "",
+) -> AsyncIterator[str]:
+    """Continua a narrativa transmitindo o texto da LLM trecho a trecho."""
+    messages = build_continue_messages(
+        character,
+        battle_theme,
+        history,
+        player_action,
+        memory,
+        outcome,
+        history_summary,
+    )
+    async for token in llm_prompt_stream(messages):
+        yield token
+
+
+# --- Resumo Acumulado do Histórico da Batalha ---
+
+
+async def summarize_battle_history(summary: str, lines: List[str]) -> Optional[str]:
+    """Incorpora novas falas ao resumo acumulado dos turnos anteriores."""
+    lines_str = "\n".join(lines)
+    max_words = settings.PROMPT_HISTORY_TOKENS // 6
+    prompt = f"""
+    Você é o cronista de uma batalha de RPG. Atualize o resumo da batalha com os novos acontecimentos.
+
+    Resumo até agora:
+    ---
+    {summary if summary else "Nenhum."}
+    ---
+
+    Novos acontecimentos:
+    ---
+    {lines_str}
+    ---
+
+    Instruções:
+    1. Responda apenas com o resumo atualizado, em um único parágrafo, com no máximo {max_words} palavras.
+    2. Preserve golpes marcantes, ferimentos, estratégias e o estado atual da luta.
+    """
+    response = await llm_prompt([{"role": "user", "content": prompt}])
+    if not response or response == LLM_FAILURE_MESSAGE:
+        return None
+    return response.strip()
+
+
+_summary_refreshes: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def schedule_history_summary(
+    db, character_id: str, battle_id: str, battle_state: Dict[str, Any], upto: int
+):
+    """
+    Atualiza em segundo plano o resumo com as falas que saíram da janela do
+    prompt (de `summarized_until` até `upto`). Uma atualização por batalha.
+    """
+    key = (character_id, battle_id)
+    running = _summary_refreshes.get(key)
+    if running is not None and not running.done():
+        return
+    summarized_until = battle_state.get("summarized_until", 0)
+    limit = min(upto - summarized_until, settings.PROMPT_SUMMARY_MAX_ENTRIES)
+    if limit <= 0:
+        return
+
+    async def refresh():
+        try:
+            page = await crud_battle.get_battle_history_page(
+                db, character_id, battle_id, None, summarized_until, limit
+            )
+            if not page or not page["history"]:
+                return
+            summary = await summarize_battle_history(
+                battle_state.get("history_summary", ""),
+                prompt_budget.format_history(page["history"]),
+            )
+            until = summarized_until + len(page["history"])
+            if summary and await crud_battle.update_battle_summary(
+                db, character_id, battle_id, summary, until, summarized_until
+            ):
+                # Estados mantidos em memória (sessão do websocket) veem o resumo.
+                battle_state["history_summary"] = summary
+                battle_state["summarized_until"] = until
+        except Exception:
+            log_exception()
+        finally:
+            _summary_refreshes.pop(key, None)
+
+    _summary_refreshes[key] = asyncio.create_task(refresh())
+
+
 async def generate_action_suggestions(battle_theme: str, history: List[str]) -> str:
     """Gera sugestões de ação contextuais para o jogador."""
+    _, history = prompt_budget.fit_history(history)
     history_str = "\n".join(history)
     prompt = f"""
     Você é um Mestre de RPG. Sua tarefa é fornecer 3 sugestões de ações curtas e concisas para o jogador, baseadas no contexto da batalha.
@@ -157,34 +491,374 @@ async def generate_action_suggestions(battle_theme: str, history: List[str]) ->
     Atacar o núcleo|Analisar os padrões de ataque|Usar cobertura
     """
     messages = [{"role": "user", "content": prompt}]
-    return await llm_prompt(messages)
+    return await cached_llm_prompt(messages, "action_suggestions")
+
+
+def parse_action_suggestions(suggestions_str: str) -> List[str]:
+    """Extrai até 3 sugestões separadas por '|' (ou uma por linha) da resposta."""
+    # Usa regex para encontrar uma lista de sugestões separadas por '|' ou em formato de lista
+    match = re.search(r"([^\n]+)\|([^\n]+)\|([^\n]+)", suggestions_str)
+    if match:
+        return [
+            match.group(1).strip(),
+            match.group(2).strip(),
+            match.group(3).strip(),
+        ]
+    return [s.strip() for s in suggestions_str.split("\n") if s.strip()][:3]
+
+
+async def suggest_actions(battle_theme: str, history: List[str]) -> List[str]:
+    """Gera e já interpreta as sugestões de ação para o jogador."""
+    suggestions_str = await generate_action_suggestions(battle_theme, history)
+    return parse_action_suggestions(suggestions_str)
+
+
+speculative_suggestions = SpeculativeSuggestions(
+    generate=suggest_actions,
+    max_entries=settings.SUGGESTIONS_CACHE_MAX_ENTRIES,
+    ttl=settings.SUGGESTIONS_CACHE_TTL_SECONDS,
+)
 
 
 # --- Funções do Banco de Dados Vetorial (Memória do Personagem) ---
 
 
-def save_interaction(character_id: str, text: str):
-    """Salva uma interação (do jogador ou da LLM) no ChromaDB."""
-    collection.add(
-        ids=[str(uuid.uuid4())],
-        documents=[text],
-        metadatas=[{"character_id": character_id}],
+# Tipos de memória gravados nos metadados
+MEMORY_KIND_PLAYER = "player"
+MEMORY_KIND_NARRATOR = "narrator"
+MEMORY_KIND_SUMMARY = "summary"
+
+MemoryEntry = Tuple[str, str, str, Dict[str, Any]]
+
+
+def memory_metadata(
+    character_id: str, kind: str, battle_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Metadados de uma memória; o ChromaDB não aceita valores nulos."""
+    metadata = {"character_id": character_id, "kind": kind, "timestamp": time.time()}
+    if battle_id:
+        metadata["battle_id"] = battle_id
+    return metadata
+
+
+# Camada quente: memórias dos personagens em batalha ficam no próprio worker.
+# Com executor de processos, cada processo mantém a sua (e usa o ChromaDB no resto).
+hot_memory = HotMemoryIndex(
+    max_characters=settings.MEMORY_HOT_TIER_MAX_CHARACTERS,
+    max_vectors=settings.MEMORY_HOT_TIER_MAX_VECTORS,
+    idle_ttl=settings.MEMORY_HOT_TIER_IDLE_SECONDS,
+)
+
+
+def load_hot_memory(character_id: str):
+    """Carrega do ChromaDB todas as memórias do personagem para a camada quente."""
+    if not hot_memory.begin_load(character_id):
+        return
+    try:
+        results = get_collection().get(
+            where={"character_id": character_id},
+            include=["documents", "embeddings"],
+            limit=settings.MEMORY_HOT_TIER_MAX_VECTORS + 1,
+        )
+    except Exception:
+        hot_memory.cancel_load(character_id)
+        raise
+    hot_memory.finish_load(
+        character_id,
+        results.get("ids") or [],
+        results.get("documents") or [],
+        results.get("embeddings") or [],
     )
 
 
-def retrieve_memory(character_id: str, query: str, top_k=10) -> str:
-    """Busca as memórias mais relevantes para um personagem com base em uma query."""
-    if not query:
-        return ""
+def retrieve_candidates(character_id: str, query: str, top_k: int) -> List[str]:
+    """Candidatos da camada quente se o personagem estiver nela, senão do ChromaDB."""
+    if settings.MEMORY_HOT_TIER_ENABLED:
+        documents = hot_memory.search(character_id, embed_texts([query])[0], top_k)
+        if documents is not None:
+            return documents
 
-    results = collection.query(
+    results = get_collection().query(
         query_texts=[query], n_results=top_k, where={"character_id": character_id}
     )
-
     documents = results.get("documents")
-    if not documents or not documents[0]:
-        return "Nenhuma memória relevante encontrada."
+    return documents[0] if documents else []
+
+
+def score_pairs(pairs: List[Tuple[str, str]]) -> List[float]:
+    """Notas de relevância do reranker para pares (consulta, documento)."""
+    scores = get_reranker().predict(pairs, batch_size=settings.RERANK_MAX_BATCH_PAIRS)
+    return [float(score) for score in scores]
 
-    # Refina os resultados com o reranker para obter o melhor contexto
-    relevant_memories = reranker.rank(query, documents[0], return_documents=True)[:5]
-    return "\n".join([r["text"] for r in relevant_memories])
\ No newline at end of file
+
+async def score_pairs_async(pairs: List[Tuple[str, str]]) -> List[float]:
+    return await get_inference_executor().run(score_pairs, pairs)
+
+
+rerank_batcher = RerankBatcher(
+    score=score_pairs_async,
+    max_batch=settings.RERANK_MAX_BATCH_PAIRS,
+    window=settings.RERANK_BATCH_WINDOW_SECONDS,
+)
+
+
+def top_documents(documents: List[str], scores: List[float], top_k: int) -> List[str]:
+    ranked = sorted(zip(scores, documents), key=lambda item: item[0], reverse=True)
+    return [document for _, document in ranked[:top_k]]
+
+
+rerank_stats = {"reranked": 0, "skipped": 0, "shed": 0}
+
+
+def rerank_policy() -> Dict[str, Any]:
+    return {
+        "skip_small": settings.RERANK_SKIP_SMALL,
+        "load_shedding": settings.RERANK_LOAD_SHEDDING,
+        "shed_utilization": settings.RERANK_SHED_UTILIZATION,
+        "quantize_int8": settings.RERANK_QUANTIZE_INT8,
+        "quantized": _reranker_quantized,
+        **rerank_stats,
+    }
+
+
+async def rerank_context(
+    query: str, documents: List[str], top_k=RERANK_TOP_K
+) -> List[str]:
+    """
+    Reordena os candidatos pela relevância para a query e devolve os `top_k`.
+
+    Os candidatos já chegam ordenados pela similaridade dos embeddings. Se não
+    passam de `top_k`, ou se o executor estiver sobrecarregado, essa ordem é
+    usada como está e o reranker não é chamado.
+    """
+    if settings.RERANK_SKIP_SMALL and len(documents) <= top_k:
+        rerank_stats["skipped"] += 1
+        return documents
+    if (
+        settings.RERANK_LOAD_SHEDDING
+        and get_inference_executor().utilization() >= settings.RERANK_SHED_UTILIZATION
+    ):
+        rerank_stats["shed"] += 1
+        return documents[:top_k]
+    try:
+        # O reranker avalia num só lote os candidatos de buscas simultâneas.
+        scores = await rerank_batcher.rank(query, documents)
+    except (ExecutorBusyError, ExecutorTimeoutError):
+        log_exception()
+        rerank_stats["shed"] += 1
+        return documents[:top_k]
+    rerank_stats["reranked"] += 1
+    return top_documents(documents, scores, top_k)
+
+
+# --- Escrita em Lote (write-behind) ---
+
+
+def save_interactions_batch(entries: List[MemoryEntry]):
+    """
+    Grava um lote de interações `(id, character_id, texto, metadados)` no
+    ChromaDB, calculando todos os embeddings numa única chamada ao modelo.
+    """
+    if not entries:
+        return
+    ids = [entry[0] for entry in entries]
+    documents = [entry[2] for entry in entries]
+    metadatas = [entry[3] for entry in entries]
+    embeddings = embed_texts(documents).tolist()
+    # Upsert: um lote regravado após timeout (que chegou a ser gravado) não
+    # duplica as entradas; a camada quente também ignora ids já conhecidos.
+    get_collection().upsert(
+        ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas
+    )
+
+    by_character: Dict[str, List[int]] = {}
+    for i, entry in enumerate(entries):
+        by_character.setdefault(entry[1], []).append(i)
+    for character_id, rows in by_character.items():
+        hot_memory.append(
+            character_id,
+            [ids[i] for i in rows],
+            [documents[i] for i in rows],
+            [embeddings[i] for i in rows],
+        )
+
+
+class InteractionBuffer:
+    """
+    Acumula interações de todas as sessões e as grava em lote no ChromaDB,
+    por intervalo de tempo ou quando o lote atinge o tamanho máximo.
+
+    A fila guarda no máximo `max_pending` entradas: com o ChromaDB fora do ar,
+    as mais antigas são descartadas (e contadas em `dropped`).
+    """
+
+    def __init__(self, flush_interval: float, max_batch: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: List[MemoryEntry] = []
+        self._in_flight: List[MemoryEntry] = []
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, character_id: str, text: str, metadata: Dict[str, Any]):
+        self._pending.append((str(uuid.uuid4()), character_id, text, metadata))
+        self._drop_oldest()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def _drop_oldest(self):
+        excess = len(self._pending) - self.max_pending
+        if excess > 0:
+            del self._pending[:excess]
+            self.dropped += excess
+
+    def discard_battle(self, character_id: str, battle_id: str):
+        """Descarta as entradas pendentes de uma batalha (que vai ser apagada)."""
+        self._pending = [
+            entry
+            for entry in self._pending
+            if entry[1] != character_id or entry[3].get("battle_id") != battle_id
+        ]
+
+    def has_pending(self, character_id: str) -> bool:
+        """Indica se há escritas ainda não confirmadas para o personagem."""
+        return any(
+            entry[1] == character_id for entry in self._pending + self._in_flight
+        )
+
+    async def _write(self, batch: List[MemoryEntry]):
+        """Grava um lote já retirado da fila (com o lock de escrita)."""
+        self._in_flight = batch
+        try:
+            await get_inference_executor().run(save_interactions_batch, batch)
+        except Exception:
+            # Devolve o lote à fila para nova tentativa no próximo ciclo.
+            self._pending[:0] = batch
+            self._drop_oldest()
+            raise
+        finally:
+            self._in_flight = []
+
+    async def flush(self):
+        # O lock é tomado a cada lote para que `flush_character` não espere
+        # a fila inteira, só o lote em curso.
+        while self._pending:
+            async with self._flush_lock:
+                batch = self._pending[: self.max_batch]
+                del self._pending[: len(batch)]
+                if batch:
+                    await self._write(batch)
+
+    async def flush_character(self, character_id: str):
+        """Grava apenas as entradas pendentes de um personagem."""
+        async with self._flush_lock:
+            batch = [entry for entry in self._pending if entry[1] == character_id]
+            if not batch:
+                return
+            self._pending = [
+                entry for entry in self._pending if entry[1] != character_id
+            ]
+            await self._write(batch)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                log_exception()
+
+    async def close(self):
+        """Interrompe o ciclo de escrita e grava o que ainda estiver pendente."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "max_pending": self.max_pending,
+            "dropped": self.dropped,
+        }
+
+
+interaction_buffer = InteractionBuffer(
+    flush_interval=settings.MEMORY_FLUSH_INTERVAL_SECONDS,
+    max_batch=settings.MEMORY_FLUSH_MAX_BATCH,
+    max_pending=settings.MEMORY_FLUSH_MAX_PENDING,
+)
+
+
+# --- Variantes Assíncronas (executadas fora do event loop) ---
+
+
+async def save_interaction_async(
+    character_id: str,
+    text: str,
+    battle_id: Optional[str] = None,
+    kind: str = MEMORY_KIND_NARRATOR,
+):
+    """Enfileira uma interação para gravação em lote no ChromaDB."""
+    interaction_buffer.add(
+        character_id, text, memory_metadata(character_id, kind, battle_id)
+    )
+
+
+_hot_memory_loads = set()
+
+
+def schedule_hot_memory_load(character_id: str):
+    """Carrega as memórias do personagem em segundo plano ao iniciar a batalha."""
+    if not settings.MEMORY_HOT_TIER_ENABLED or hot_memory.is_hot(character_id):
+        return
+
+    async def load():
+        try:
+            await get_inference_executor().run(load_hot_memory, character_id)
+        except Exception:
+            log_exception()
+
+    task = asyncio.create_task(load())
+    _hot_memory_loads.add(task)
+    task.add_done_callback(_hot_memory_loads.discard)
+
+
+async def retrieve_memory_async(character_id: str, query: str, top_k=10) -> str:
+    """
+    Busca memórias sem bloquear o event loop.
+    Se o executor estiver saturado ou estourar o tempo, a batalha segue sem memória.
+    """
+    if not query:
+        return ""
+    # Garante que o último turno do personagem já esteja visível na busca; se a
+    # gravação falhar, a busca segue com o que já está no ChromaDB.
+    if interaction_buffer.has_pending(character_id):
+        try:
+            await interaction_buffer.flush_character(character_id)
+        except Exception:
+            log_exception()
+    try:
+        documents = await get_inference_executor().run(
+            retrieve_candidates, character_id, query, top_k
+        )
+        if not documents:
+            return "Nenhuma memória relevante encontrada."
+        return "\n".join(await rerank_context(query, documents))
+    except (ExecutorBusyError, ExecutorTimeoutError):
+        log_exception()
+        return ""
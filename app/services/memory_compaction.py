@@ -0,0 +1,536 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.executors import get_inference_executor
+from app.core.free_llms import LLM_FAILURE_MESSAGE, llm_prompt
+from app.core.log_util import log_exception
+from app.crud.battle import FINISHED_STATUS
+from app.services import llm_service
+
+Memories = List[Tuple[str, str, Dict[str, Any]]]
+
+# Documento em `jobs` com a concessão entre workers e a marca d'água global
+JOB_ID = "memory_compaction"
+
+
+# --- Acesso ao ChromaDB (executado no executor de inferência) ---
+
+
+def _sorted_memories(results: Dict[str, Any]) -> Memories:
+    memories = list(
+        zip(
+            results.get("ids") or [],
+            results.get("documents") or [],
+            results.get("metadatas") or [],
+        )
+    )
+    memories.sort(key=lambda memory: memory[2].get("timestamp", 0))
+    return memories
+
+
+def fetch_battle_memories(character_id: str, battle_id: str) -> Memories:
+    """Interações brutas de uma batalha, em ordem cronológica."""
+    results = llm_service.get_collection().get(
+        where={
+            "$and": [
+                {"character_id": character_id},
+                {"battle_id": battle_id},
+                {"kind": {"$ne": llm_service.MEMORY_KIND_SUMMARY}},
+            ]
+        },
+        include=["documents", "metadatas"],
+    )
+    return _sorted_memories(results)
+
+
+def fetch_stale_memories(character_id: str, cutoff: float) -> Memories:
+    """
+    Interações brutas do personagem anteriores a `cutoff`, de qualquer batalha.
+    Entradas antigas, sem `kind` nem `timestamp`, também entram.
+    """
+    collection = llm_service.get_collection()
+    results = collection.get(
+        where={"character_id": character_id}, include=["metadatas"]
+    )
+    ids = [
+        memory_id
+        for memory_id, metadata in zip(
+            results.get("ids") or [], results.get("metadatas") or []
+        )
+        if metadata.get("kind") != llm_service.MEMORY_KIND_SUMMARY
+        and metadata.get("timestamp", 0) < cutoff
+    ]
+    if not ids:
+        return []
+    return _sorted_memories(collection.get(ids=ids, include=["documents", "metadatas"]))
+
+
+def fetch_summaries(character_id: str) -> Memories:
+    """Resumos já gravados para o personagem, do mais antigo ao mais novo."""
+    results = llm_service.get_collection().get(
+        where={
+            "$and": [
+                {"character_id": character_id},
+                {"kind": llm_service.MEMORY_KIND_SUMMARY},
+            ]
+        },
+        include=["documents", "metadatas"],
+    )
+    return _sorted_memories(results)
+
+
+def replace_memories(
+    character_id: str, summaries: List[Tuple[str, Dict[str, Any]]], ids: List[str]
+):
+    """Grava os resumos e só então apaga as memórias que eles substituem."""
+    llm_service.save_interactions_batch(
+        [
+            (str(uuid.uuid4()), character_id, text, metadata)
+            for text, metadata in summaries
+        ]
+    )
+    if ids:
+        llm_service.get_collection().delete(ids=ids)
+    # A camada quente ainda teria as entradas apagadas; recarrega no próximo uso.
+    llm_service.hot_memory.evict(character_id)
+
+
+def delete_battle_memories(character_id: str, battle_id: str):
+    """Apaga todas as memórias de uma batalha."""
+    llm_service.get_collection().delete(
+        where={"$and": [{"character_id": character_id}, {"battle_id": battle_id}]}
+    )
+    llm_service.hot_memory.evict(character_id)
+
+
+# --- Descarga da camada quente em todos os workers ---
+
+
+async def publish_hot_memory_evictions(
+    db: AsyncIOMotorDatabase, character_ids: Iterable[str]
+):
+    """Pede aos outros workers que descartem a camada quente dos personagens."""
+    if not settings.MEMORY_HOT_TIER_ENABLED:
+        return
+    now = datetime.utcnow()
+    documents = [{"character_id": cid, "at": now} for cid in character_ids]
+    if documents:
+        await db.hot_memory_invalidations.insert_many(documents)
+
+
+class HotMemoryInvalidation:
+    """
+    Aplica as descargas publicadas na coleção `hot_memory_invalidations`, como
+    `MongoUserInvalidation` faz com o cache de usuários: cada worker consulta
+    periodicamente as novas e descarta o personagem da sua camada quente, que
+    volta a ser carregada do ChromaDB no próximo uso.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase, poll_interval: float):
+        self.db = db
+        self.poll_interval = poll_interval
+        self._since = datetime.utcnow()
+        self._task: Optional[asyncio.Task] = None
+
+    async def poll(self):
+        invalidations = await self.db.hot_memory_invalidations.find(
+            {"at": {"$gte": self._since}}
+        ).to_list(None)
+        for invalidation in invalidations:
+            llm_service.hot_memory.evict(invalidation["character_id"])
+            self._since = max(self._since, invalidation["at"])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception:
+                log_exception()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def discard_battle_memories(
+    db: AsyncIOMotorDatabase, character_id: str, battle_id: str
+):
+    """
+    Apaga as memórias de uma batalha abandonada antes de apagar o estado dela.
+    As que ainda estavam sendo gravadas ficam para a compactação por idade.
+    """
+    llm_service.interaction_buffer.discard_battle(character_id, battle_id)
+    await get_inference_executor().run(delete_battle_memories, character_id, battle_id)
+    await publish_hot_memory_evictions(db, [character_id])
+
+
+# --- Resumo via LLM ---
+
+
+async def summarize_memories(texts: List[str]) -> Optional[str]:
+    """Condensa uma sequência de memórias num único parágrafo denso."""
+    memories_str = "\n".join(texts)
+    prompt = f"""
+    Você é o cronista de uma campanha de RPG. Resuma as memórias abaixo de um personagem em um único parágrafo denso, em português.
+
+    Memórias:
+    ---
+    {memories_str}
+    ---
+
+    Instruções:
+    1. Preserve nomes, inimigos, locais, itens, decisões importantes e o desfecho das lutas.
+    2. Descarte detalhes repetidos ou puramente descritivos.
+    3. Responda apenas com o resumo, sem títulos ou comentários.
+    """
+    summary = await llm_prompt([{"role": "user", "content": prompt}])
+    if not summary or summary == LLM_FAILURE_MESSAGE:
+        return None
+    return summary.strip()
+
+
+class MemoryCompactor:
+    """
+    Compacta periodicamente a memória dos personagens no ChromaDB.
+
+    As interações de batalhas concluídas viram poucos resumos (um a cada
+    `chunk_size` interações) e as entradas originais são apagadas. Quando um
+    personagem passa de `max_summaries` resumos, os mais antigos são fundidos.
+    O progresso fica na coleção `memory_compaction` do MongoDB: a marca d'água
+    é o `last_updated` da última batalha compactada de cada personagem.
+
+    Só um worker compacta por vez: a rodada começa tomando a concessão do
+    documento `JOB_ID` na coleção `jobs` (com expiração, renovada a cada
+    personagem). O mesmo documento guarda a marca d'água global, para que cada
+    rodada leia apenas as batalhas concluídas depois dela.
+
+    Memórias que nunca entram numa batalha concluída (sem `battle_id`, de
+    batalhas apagadas ou abandonadas) são resumidas quando passam de
+    `stale_after` segundos: a cada rodada, `stale_characters_per_run`
+    personagens são verificados, em ciclo pela coleção `characters`.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        chunk_size: int,
+        max_summaries: int,
+        battles_per_run: int,
+        lease_seconds: float,
+        stale_after: float,
+        stale_characters_per_run: int,
+    ):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.max_summaries = max_summaries
+        self.battles_per_run = battles_per_run
+        self.lease_seconds = lease_seconds
+        self.stale_after = stale_after
+        self.stale_characters_per_run = stale_characters_per_run
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        # Personagens com memórias substituídas na rodada, a descartar da
+        # camada quente dos outros workers
+        self._replaced: Set[str] = set()
+        self._stats = {
+            "runs": 0,
+            "lease_skipped": 0,
+            "battles_compacted": 0,
+            "stale_compacted": 0,
+            "raw_deleted": 0,
+            "summaries_created": 0,
+            "summaries_merged": 0,
+            "failures": 0,
+        }
+
+    async def _summarize_chunks(
+        self, character_id: str, battle_id: Optional[str], memories: Memories
+    ) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        summaries = []
+        for start in range(0, len(memories), self.chunk_size):
+            chunk = memories[start : start + self.chunk_size]
+            summary = await summarize_memories([document for _, document, _ in chunk])
+            if summary is None:
+                return None
+            metadata = llm_service.memory_metadata(
+                character_id, llm_service.MEMORY_KIND_SUMMARY, battle_id
+            )
+            metadata["timestamp"] = chunk[-1][2].get("timestamp", metadata["timestamp"])
+            summaries.append((summary, metadata))
+        return summaries
+
+    async def _replace(
+        self,
+        character_id: str,
+        summaries: List[Tuple[str, Dict[str, Any]]],
+        ids: List[str],
+    ):
+        await get_inference_executor().run(
+            replace_memories, character_id, summaries, ids
+        )
+        self._replaced.add(character_id)
+
+    async def compact_battle(self, character_id: str, battle_id: str) -> bool:
+        """Substitui as interações da batalha por resumos. False se a LLM falhar."""
+        executor = get_inference_executor()
+        memories = await executor.run(fetch_battle_memories, character_id, battle_id)
+        if not memories:
+            return True
+        summaries = await self._summarize_chunks(character_id, battle_id, memories)
+        if summaries is None:
+            return False
+        await self._replace(
+            character_id, summaries, [memory_id for memory_id, _, _ in memories]
+        )
+        self._stats["raw_deleted"] += len(memories)
+        self._stats["summaries_created"] += len(summaries)
+        return True
+
+    async def compact_stale(self, character_id: str) -> bool:
+        """Resume as memórias brutas antigas do personagem. False se a LLM falhar."""
+        memories = await get_inference_executor().run(
+            fetch_stale_memories, character_id, time.time() - self.stale_after
+        )
+        if len(memories) < 2:
+            return True
+        summaries = await self._summarize_chunks(character_id, None, memories)
+        if summaries is None:
+            self._stats["failures"] += 1
+            return False
+        await self._replace(
+            character_id, summaries, [memory_id for memory_id, _, _ in memories]
+        )
+        self._stats["stale_compacted"] += len(memories)
+        self._stats["raw_deleted"] += len(memories)
+        self._stats["summaries_created"] += len(summaries)
+        return True
+
+    async def merge_summaries(self, character_id: str):
+        """Funde os resumos mais antigos enquanto o personagem passar do limite."""
+        executor = get_inference_executor()
+        summaries = await executor.run(fetch_summaries, character_id)
+        excess = len(summaries) - self.max_summaries
+        if excess <= 0:
+            return
+        oldest = summaries[: min(max(excess + 1, 2), self.chunk_size)]
+        merged = await summarize_memories([document for _, document, _ in oldest])
+        if merged is None:
+            self._stats["failures"] += 1
+            return
+        metadata = llm_service.memory_metadata(
+            character_id, llm_service.MEMORY_KIND_SUMMARY
+        )
+        metadata["timestamp"] = oldest[-1][2].get("timestamp", metadata["timestamp"])
+        await self._replace(
+            character_id,
+            [(merged, metadata)],
+            [memory_id for memory_id, _, _ in oldest],
+        )
+        self._stats["summaries_merged"] += len(oldest)
+
+    async def compact_character(
+        self, db: AsyncIOMotorDatabase, character_id: str
+    ) -> bool:
+        """Compacta as batalhas pendentes do personagem. True se não sobrou nenhuma."""
+        progress = await db.memory_compaction.find_one({"character_id": character_id})
+        watermark = (progress or {}).get("watermark", "")
+        battles = (
+            await db.battle_states.find(
+                {
+                    "character_id": character_id,
+                    "status": FINISHED_STATUS,
+                    "last_updated": {"$gt": watermark},
+                },
+                {"battle_id": 1, "last_updated": 1},
+            )
+            .sort("last_updated", 1)
+            .to_list(self.battles_per_run)
+        )
+
+        done = len(battles) < self.battles_per_run
+        for battle in battles:
+            if not await self.compact_battle(character_id, battle["battle_id"]):
+                # Mantém a marca d'água antes desta batalha para tentar de novo.
+                self._stats["failures"] += 1
+                done = False
+                break
+            self._stats["battles_compacted"] += 1
+            await db.memory_compaction.update_one(
+                {"character_id": character_id},
+                {
+                    "$set": {
+                        "watermark": battle["last_updated"],
+                        "compacted_at": datetime.utcnow().isoformat(),
+                    }
+                },
+                upsert=True,
+            )
+
+        await self.merge_summaries(character_id)
+        return done
+
+    async def acquire_lease(self, db: AsyncIOMotorDatabase) -> bool:
+        """Toma ou renova a concessão; False se outro worker a detém."""
+        now = datetime.utcnow()
+        try:
+            await db.jobs.find_one_and_update(
+                {
+                    "_id": JOB_ID,
+                    "$or": [{"lease_until": {"$lte": now}}, {"owner": self.owner}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # O documento existe e a concessão é de outro worker.
+            return False
+        return True
+
+    async def release_lease(self, db: AsyncIOMotorDatabase):
+        await db.jobs.update_one(
+            {"_id": JOB_ID, "owner": self.owner},
+            {"$set": {"lease_until": datetime.utcnow()}},
+        )
+
+    async def _compact_pending(self, db: AsyncIOMotorDatabase):
+        job = await db.jobs.find_one({"_id": JOB_ID}, {"watermark": 1})
+        watermark = (job or {}).get("watermark", "")
+        battles = (
+            await db.battle_states.find(
+                {"status": FINISHED_STATUS, "last_updated": {"$gt": watermark}},
+                {"character_id": 1, "last_updated": 1},
+            )
+            .sort("last_updated", 1)
+            .to_list(self.battles_per_run)
+        )
+
+        done: Dict[str, bool] = {}
+        for battle in battles:
+            character_id = battle["character_id"]
+            if character_id in done:
+                continue
+            if not await self.acquire_lease(db):
+                self._stats["lease_skipped"] += 1
+                break
+            try:
+                done[character_id] = await self.compact_character(db, character_id)
+            except Exception:
+                done[character_id] = False
+                self._stats["failures"] += 1
+                log_exception()
+
+        # A marca d'água global só passa das batalhas cujo personagem ficou em dia.
+        new_watermark = watermark
+        for battle in battles:
+            if not done.get(battle["character_id"]):
+                break
+            new_watermark = battle["last_updated"]
+        if new_watermark != watermark:
+            await db.jobs.update_one(
+                {"_id": JOB_ID, "owner": self.owner},
+                {"$set": {"watermark": new_watermark}},
+            )
+
+    async def _compact_stale_characters(self, db: AsyncIOMotorDatabase):
+        job = await db.jobs.find_one({"_id": JOB_ID}, {"stale_cursor": 1})
+        cursor = (job or {}).get("stale_cursor")
+        characters = (
+            await db.characters.find(
+                {"_id": {"$gt": cursor}} if cursor else {}, {"_id": 1}
+            )
+            .sort("_id", 1)
+            .to_list(self.stale_characters_per_run)
+        )
+
+        for character in characters:
+            if not await self.acquire_lease(db):
+                self._stats["lease_skipped"] += 1
+                return
+            character_id = str(character["_id"])
+            try:
+                if await self.compact_stale(character_id):
+                    await self.merge_summaries(character_id)
+            except Exception:
+                self._stats["failures"] += 1
+                log_exception()
+
+        # Ao chegar ao fim da coleção, a próxima rodada recomeça do início.
+        full = len(characters) == self.stale_characters_per_run
+        await db.jobs.update_one(
+            {"_id": JOB_ID, "owner": self.owner},
+            {"$set": {"stale_cursor": characters[-1]["_id"] if full else None}},
+        )
+
+    async def run_once(self, db: AsyncIOMotorDatabase):
+        if not await self.acquire_lease(db):
+            self._stats["lease_skipped"] += 1
+            return
+        try:
+            await self._compact_pending(db)
+            await self._compact_stale_characters(db)
+        finally:
+            replaced, self._replaced = self._replaced, set()
+            try:
+                await publish_hot_memory_evictions(db, replaced)
+            finally:
+                await self.release_lease(db)
+        self._stats["runs"] += 1
+
+    async def _run(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once(db)
+            except Exception:
+                log_exception()
+
+    def start(self, db: AsyncIOMotorDatabase):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats)
+
+
+memory_compactor = MemoryCompactor(
+    interval=settings.MEMORY_COMPACTION_INTERVAL_SECONDS,
+    chunk_size=settings.MEMORY_COMPACTION_CHUNK_SIZE,
+    max_summaries=settings.MEMORY_COMPACTION_MAX_SUMMARIES,
+    battles_per_run=settings.MEMORY_COMPACTION_BATTLES_PER_RUN,
+    lease_seconds=settings.MEMORY_COMPACTION_LEASE_SECONDS,
+    stale_after=settings.MEMORY_COMPACTION_STALE_AFTER_SECONDS,
+    stale_characters_per_run=settings.MEMORY_COMPACTION_STALE_CHARACTERS_PER_RUN,
+)
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class _CharacterMemories:
+    def __init__(self):
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.loading = True
+        self.last_used = time.monotonic()
+
+    def extend(self, ids: List[str], documents: List[str], embeddings: Any):
+        known = set(self.ids)
+        rows = [i for i, entry_id in enumerate(ids) if entry_id not in known]
+        if not rows:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)[rows]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1.0, norms)
+        self.ids.extend(ids[i] for i in rows)
+        self.documents.extend(documents[i] for i in rows)
+        if self.matrix.size:
+            self.matrix = np.vstack([self.matrix, vectors])
+        else:
+            self.matrix = vectors
+
+
+class HotMemoryIndex:
+    """
+    Camada quente de memórias: mantém em memória, para cada personagem em
+    batalha, a matriz de embeddings normalizados de todas as suas interações e
+    responde buscas com um produto escalar vetorizado, sem ir ao ChromaDB.
+
+    Personagens sem uso por `idle_ttl` segundos (ou além de `max_characters`)
+    são descartados e voltam a ser atendidos pelo ChromaDB.
+    """
+
+    def __init__(self, max_characters: int, max_vectors: int, idle_ttl: float):
+        self.max_characters = max_characters
+        self.max_vectors = max_vectors
+        self.idle_ttl = idle_ttl
+        self._characters: "OrderedDict[str, _CharacterMemories]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def _evict_idle_locked(self):
+        deadline = time.monotonic() - self.idle_ttl
+        for character_id, memories in list(self._characters.items()):
+            if memories.last_used < deadline:
+                del self._characters[character_id]
+                self.evictions += 1
+        while len(self._characters) > self.max_characters:
+            self._characters.popitem(last=False)
+            self.evictions += 1
+
+    def is_hot(self, character_id: str) -> bool:
+        with self._lock:
+            memories = self._characters.get(character_id)
+            return memories is not None and not memories.loading
+
+    def begin_load(self, character_id: str) -> bool:
+        """
+        Reserva a entrada do personagem antes de ler o ChromaDB, para que as
+        escritas feitas durante a carga não se percam. Devolve False se ele já
+        estiver na camada quente (ou em carga).
+        """
+        with self._lock:
+            self._evict_idle_locked()
+            if character_id in self._characters:
+                self._characters[character_id].last_used = time.monotonic()
+                self._characters.move_to_end(character_id)
+                return False
+            self._characters[character_id] = _CharacterMemories()
+            return True
+
+    def finish_load(
+        self,
+        character_id: str,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Any,
+    ):
+        """Completa a carga com o que foi lido do ChromaDB."""
+        with self._lock:
+            memories = self._characters.get(character_id)
+            if memories is None:
+                return
+            if len(ids) + len(memories.ids) > self.max_vectors:
+                # Memória grande demais para a camada quente: fica no ChromaDB.
+                del self._characters[character_id]
+                return
+            if ids:
+                memories.extend(ids, documents, embeddings)
+            memories.loading = False
+            memories.last_used = time.monotonic()
+            self.loads += 1
+
+    def cancel_load(self, character_id: str):
+        with self._lock:
+            memories = self._characters.get(character_id)
+            if memories is not None and memories.loading:
+                del self._characters[character_id]
+
+    def append(
+        self,
+        character_id: str,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Any,
+    ):
+        """Acrescenta interações recém-gravadas, se o personagem estiver carregado."""
+        with self._lock:
+            memories = self._characters.get(character_id)
+            if memories is None:
+                return
+            memories.extend(ids, documents, embeddings)
+            if len(memories.ids) > self.max_vectors:
+                del self._characters[character_id]
+                self.evictions += 1
+
+    def search(
+        self, character_id: str, query_vector: Any, top_k: int
+    ) -> Optional[List[str]]:
+        """
+        Devolve os `top_k` documentos mais próximos da consulta (similaridade de
+        cosseno), ou None se o personagem não estiver na camada quente.
+        """
+        with self._lock:
+            memories = self._characters.get(character_id)
+            if memories is None or memories.loading:
+                self.misses += 1
+                return None
+            memories.last_used = time.monotonic()
+            self._characters.move_to_end(character_id)
+            self.hits += 1
+            matrix, documents = memories.matrix, memories.documents
+        if not documents:
+            return []
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        scores = matrix @ (query / norm if norm else query)
+        k = min(top_k, len(documents))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [documents[i] for i in best]
+
+    def evict(self, character_id: str):
+        with self._lock:
+            if self._characters.pop(character_id, None) is not None:
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict_idle_locked()
+            lookups = self.hits + self.misses
+            return {
+                "characters": len(self._characters),
+                "vectors": sum(len(m.ids) for m in self._characters.values()),
+                "bytes": sum(m.matrix.nbytes for m in self._characters.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
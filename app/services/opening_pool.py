@@ -0,0 +1,184 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.log_util import log_exception
+
+PoolKey = Tuple[str, str, str]
+GenerateFunc = Callable[[str, str, str], Awaitable[Optional[str]]]
+
+
+class OpeningPool:
+    """
+    Reserva de narrativas de abertura já geradas por (tema, raça, classe).
+
+    Um único worker em segundo plano gera uma abertura por vez, com pausa entre
+    as gerações, mantendo até `size` aberturas prontas por combinação. Começar
+    uma batalha só consome uma abertura e agenda a reposição.
+
+    Tema, raça e classe vêm do cliente, então só os temas configurados entram
+    na reserva, o número de combinações é fixo em `max_keys` (as novas são
+    recusadas quando está cheia) e a reposição só roda com `is_idle()`
+    verdadeiro, sem disputar os provedores com os jogadores.
+    """
+
+    def __init__(
+        self,
+        generate: GenerateFunc,
+        size: int,
+        max_keys: int,
+        refill_interval: float,
+        themes: Iterable[str] = (),
+        is_idle: Callable[[], bool] = lambda: True,
+    ):
+        self.generate = generate
+        self.size = size
+        self.max_keys = max_keys
+        self.refill_interval = refill_interval
+        self.themes = {theme.strip() for theme in themes}
+        self.is_idle = is_idle
+        self._pools: "OrderedDict[PoolKey, Deque[str]]" = OrderedDict()
+        self._queue: "asyncio.Queue[PoolKey]" = asyncio.Queue()
+        self._queued: Set[PoolKey] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failures = 0
+        self.rejected = 0
+        self.deferred = 0
+
+    @staticmethod
+    def key(theme: str, race: str, char_class: str) -> PoolKey:
+        return (theme.strip(), race.strip().lower(), char_class.strip().lower())
+
+    def register(self, theme: str, race: str, char_class: str) -> bool:
+        """
+        Passa a manter aberturas prontas para a combinação. Devolve False se o
+        tema não for um dos configurados ou se a reserva já tiver `max_keys`.
+        """
+        key = self.key(theme, race, char_class)
+        if key[0] not in self.themes:
+            return False
+        if key not in self._pools:
+            if len(self._pools) >= self.max_keys:
+                self.rejected += 1
+                return False
+            self._pools[key] = deque()
+        self._pools.move_to_end(key)
+        self._schedule(key)
+        return True
+
+    def take(self, theme: str, race: str, char_class: str) -> Optional[str]:
+        """Consome uma abertura pronta, ou None se a reserva estiver vazia."""
+        key = self.key(theme, race, char_class)
+        if key[0] not in self.themes:
+            return None
+        pool = self._pools.get(key)
+        self.register(theme, race, char_class)
+        if pool:
+            self.hits += 1
+            return pool.popleft()
+        self.misses += 1
+        return None
+
+    def _schedule(self, key: PoolKey):
+        pool = self._pools.get(key)
+        if pool is None or len(pool) >= self.size or key in self._queued:
+            return
+        self._queued.add(key)
+        self._queue.put_nowait(key)
+
+    async def prime_from_db(
+        self, db: AsyncIOMotorDatabase, themes: list, top_combinations: int
+    ):
+        """Registra os temas comuns com as combinações de raça e classe mais jogadas."""
+        try:
+            combinations = await db.characters.aggregate(
+                [
+                    {
+                        "$group": {
+                            "_id": {"race": "$race", "class": "$class"},
+                            "n": {"$sum": 1},
+                        }
+                    },
+                    {"$sort": {"n": -1}},
+                    {"$limit": top_combinations},
+                ]
+            ).to_list(top_combinations)
+        except Exception:
+            log_exception()
+            return
+        for theme in themes:
+            for combination in combinations:
+                race = combination["_id"].get("race")
+                char_class = combination["_id"].get("class")
+                if race and char_class:
+                    self.register(theme, race, char_class)
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            while not self.is_idle():
+                self.deferred += 1
+                await asyncio.sleep(self.refill_interval)
+            self._queued.discard(key)
+            pool = self._pools.get(key)
+            if pool is None or len(pool) >= self.size:
+                continue
+
+            delay = self.refill_interval
+            try:
+                narrative = await self.generate(*key)
+            except Exception:
+                log_exception()
+                narrative = None
+            if narrative:
+                pool.append(narrative)
+                self.generated += 1
+            else:
+                self.failures += 1
+                # Provedores indisponíveis: espera mais antes de tentar de novo.
+                delay *= 10
+            self._schedule(key)
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "combinations": len(self._pools),
+            "ready": sum(len(pool) for pool in self._pools.values()),
+            "queued": len(self._queued),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "generated": self.generated,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "deferred": self.deferred,
+        }
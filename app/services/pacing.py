@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Optional
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+
+PACING_NONE = "none"
+PACING_SERVER = "server"
+PACING_BATCHED = "batched"
+PACING_MODES = (PACING_NONE, PACING_SERVER, PACING_BATCHED)
+
+
+def resolve_pacing_mode(requested: Optional[str]) -> str:
+    """Usa o modo pedido pelo cliente se for válido, senão o padrão configurado."""
+    if requested in PACING_MODES:
+        return requested
+    return settings.WS_PACING_MODE
+
+
+class NarrativePacer:
+    """
+    Controla o ritmo de envio dos trechos de narrativa em uma conexão WebSocket.
+
+    - `none`: envia cada trecho assim que chega (o cliente anima localmente).
+    - `server`: espaça os trechos no servidor, como um texto sendo "digitado".
+    - `batched`: agrupa trechos em menos frames, por tamanho ou intervalo.
+    """
+
+    def __init__(self, websocket: WebSocket, mode: str):
+        self.websocket = websocket
+        self.mode = mode
+        self._buffer = ""
+        self._last_sent = time.monotonic()
+
+    async def pause(self, seconds: float):
+        """Pausa dramática; só tem efeito no modo `server`."""
+        if self.mode == PACING_SERVER:
+            await asyncio.sleep(seconds)
+
+    async def send_chunk(self, text: str, delay: Optional[float] = None):
+        """
+        Envia um trecho de narrativa. No modo `server`, espera `delay` segundos
+        depois do envio (por padrão, proporcional ao tamanho do trecho).
+        """
+        if not text:
+            return
+        if self.mode == PACING_BATCHED:
+            self._buffer += text
+            elapsed = time.monotonic() - self._last_sent
+            if (
+                len(self._buffer) >= settings.WS_PACING_BATCH_CHARS
+                or elapsed >= settings.WS_PACING_BATCH_INTERVAL_SECONDS
+            ):
+                await self.flush()
+            return
+
+        await self.websocket.send_json({"type": "narrative_chunk", "payload": text})
+        if self.mode == PACING_SERVER:
+            if delay is None:
+                delay = min(len(text) * 0.02, 1.5)
+            await asyncio.sleep(delay)
+
+    async def flush(self):
+        """Envia o que estiver acumulado no modo `batched`."""
+        if self._buffer:
+            payload, self._buffer = self._buffer, ""
+            await self.websocket.send_json(
+                {"type": "narrative_chunk", "payload": payload}
+            )
+        self._last_sent = time.monotonic()
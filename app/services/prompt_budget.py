@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Aproximação usada para texto em português nos modelos servidos: ~4 caracteres
+# por token. Não precisa ser exata, só estável e barata.
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARK = " [...]"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, budget: int) -> str:
+    """Corta o texto para caber no orçamento de tokens, mantendo o início."""
+    if estimate_tokens(text) <= budget:
+        return text
+    limit = max(budget * CHARS_PER_TOKEN - len(TRUNCATION_MARK), 0)
+    return text[:limit].rstrip() + TRUNCATION_MARK
+
+
+def format_history(history: List[Dict[str, str]]) -> List[str]:
+    return [f"{entry['speaker']}: {entry['text']}" for entry in history]
+
+
+def fit_history(
+    lines: List[str],
+    summary: str = "",
+    budget: Optional[int] = None,
+    max_lines: Optional[int] = None,
+) -> Tuple[str, List[str]]:
+    """
+    Monta a janela de histórico do prompt: o resumo dos turnos anteriores (até
+    um terço do orçamento) e, no que sobrar, as falas mais recentes na íntegra.
+    """
+    budget = settings.PROMPT_HISTORY_TOKENS if budget is None else budget
+    max_lines = (
+        settings.PROMPT_HISTORY_MAX_TURNS * 2 if max_lines is None else max_lines
+    )
+    summary = truncate_tokens(summary, budget // 3) if summary else ""
+    remaining = budget - estimate_tokens(summary)
+
+    kept: List[str] = []
+    for line in reversed(lines[-max_lines:] if max_lines else []):
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            if not kept and remaining > 0:
+                # A fala mais recente sempre entra, nem que seja cortada.
+                kept.append(truncate_tokens(line, remaining))
+            break
+        kept.append(line)
+        remaining -= cost
+    kept.reverse()
+    return summary, kept
+
+
+def fit_instructions(battle_theme: str, player_action: str) -> Tuple[str, str]:
+    """
+    Limita as partes das instruções que vêm do jogador (tema e ação) ao
+    orçamento da seção; o restante do texto das instruções é fixo.
+    """
+    budget = settings.PROMPT_INSTRUCTIONS_TOKENS
+    battle_theme = truncate_tokens(battle_theme, budget // 3)
+    player_action = truncate_tokens(
+        player_action, budget - estimate_tokens(battle_theme)
+    )
+    return battle_theme, player_action
+
+
+def history_window(battle_state: Dict[str, Any]) -> Tuple[str, List[str], int]:
+    """
+    Janela de histórico a partir do estado salvo (lido com `history_tail`).
+    Devolve o resumo, as falas na íntegra e o índice da primeira delas.
+    """
+    history = battle_state.get("history", [])
+    length = battle_state.get("history_length", len(history))
+    first_index = length - len(history)
+    summarized_until = battle_state.get("summarized_until", 0)
+    # Falas já cobertas pelo resumo não são repetidas na íntegra.
+    recent = history[max(summarized_until - first_index, 0) :]
+    summary, lines = fit_history(
+        format_history(recent), battle_state.get("history_summary", "")
+    )
+    return summary, lines, length - len(lines)
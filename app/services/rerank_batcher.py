@@ -0,0 +1,144 @@
+import asyncio
+import time
+from collections import deque
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.core.log_util import log_exception
+
+Pair = Tuple[str, str]
+ScoreFunc = Callable[[List[Pair]], Awaitable[Sequence[float]]]
+
+
+class _RerankRequest:
+    def __init__(self, pairs: List[Pair], future: asyncio.Future):
+        self.pairs = pairs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class RerankBatcher:
+    """
+    Junta os pares (consulta, documento) de chamadas simultâneas ao reranker.
+
+    O primeiro pedido abre uma janela de `window` segundos; tudo o que chegar
+    nela (até `max_batch` pares) vai numa única chamada a `score`, e cada
+    chamador recebe apenas as notas dos seus documentos.
+    """
+
+    def __init__(self, score: ScoreFunc, max_batch: int, window: float):
+        self.score = score
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: Deque[_RerankRequest] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "pairs": 0,
+            "max_batch_size": 0,
+            "errors": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+        }
+
+    async def rank(self, query: str, documents: List[str]) -> List[float]:
+        """Devolve a nota de relevância de cada documento para a consulta."""
+        if not documents:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append(
+            _RerankRequest([(query, document) for document in documents], future)
+        )
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return await future
+
+    def _take_batch(self) -> List[_RerankRequest]:
+        batch = [self._queue.popleft()]
+        size = len(batch[0].pairs)
+        while self._queue and size + len(self._queue[0].pairs) <= self.max_batch:
+            request = self._queue.popleft()
+            batch.append(request)
+            size += len(request.pairs)
+        return batch
+
+    async def _dispatch(self, batch: List[_RerankRequest]):
+        now = time.monotonic()
+        pairs: List[Pair] = []
+        for request in batch:
+            wait = now - request.enqueued_at
+            self._stats["requests"] += 1
+            self._stats["queue_wait_total"] += wait
+            self._stats["queue_wait_max"] = max(self._stats["queue_wait_max"], wait)
+            pairs.extend(request.pairs)
+        self._stats["batches"] += 1
+        self._stats["pairs"] += len(pairs)
+        self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(pairs))
+
+        try:
+            scores = list(await self.score(pairs))
+        except Exception as e:
+            self._stats["errors"] += 1
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            end = offset + len(request.pairs)
+            if not request.future.done():
+                request.future.set_result(scores[offset:end])
+            offset = end
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            pending = sum(len(request.pairs) for request in self._queue)
+            if pending < self.max_batch:
+                # Espera um pouco para que pedidos simultâneos entrem no mesmo lote.
+                await asyncio.sleep(self.window)
+            try:
+                await self._dispatch(self._take_batch())
+            except Exception:
+                log_exception()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue:
+            request = self._queue.popleft()
+            if not request.future.done():
+                request.future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "queued": len(self._queue),
+            "avg_batch_size": self._stats["pairs"] / batches if batches else 0.0,
+            "avg_queue_wait": (
+                self._stats["queue_wait_total"] / self._stats["requests"]
+                if self._stats["requests"]
+                else 0.0
+            ),
+        }
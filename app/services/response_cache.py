@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.log_util import log_exception
+from app.utils.ttl_cache import TTLCache
+
+EmbedFunc = Callable[[List[str]], Awaitable[np.ndarray]]
+
+
+def normalize_prompt(text: str) -> str:
+    """Normaliza espaços e caixa para que prompts equivalentes gerem a mesma chave."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class ResponseCache:
+    """
+    Cache de respostas da LLM em duas camadas:
+
+    1. Exata: hash do prompt normalizado, com TTL e descarte LRU.
+    2. Semântica (opcional por chamada): compara o embedding do prompt com os
+       das respostas guardadas no mesmo namespace e reaproveita a mais
+       parecida se a similaridade de cosseno passar do limite configurado.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        semantic_threshold: float,
+        embed: Optional[EmbedFunc] = None,
+    ):
+        self._entries = TTLCache(max_entries, ttl)
+        self._vectors: Dict[str, tuple] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.semantic_threshold = semantic_threshold
+        self.embed = embed
+        self.semantic_hits = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(namespace: str, prompt: str) -> str:
+        digest = hashlib.sha256(f"{namespace}\0{prompt}".encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def prompt_text(messages: List[Dict[str, str]]) -> str:
+        return normalize_prompt(
+            json.dumps(
+                [(m["role"], m["content"]) for m in messages], ensure_ascii=False
+            )
+        )
+
+    async def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        if self.embed is None:
+            return None
+        try:
+            vector = np.asarray((await self.embed([prompt]))[0], dtype=np.float32)
+        except Exception:
+            log_exception()
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _semantic_lookup(self, namespace: str, vector: np.ndarray) -> Optional[str]:
+        keys, matrix = [], []
+        for key, (entry_namespace, entry_vector) in list(self._vectors.items()):
+            if key not in self._entries:
+                del self._vectors[key]
+                continue
+            if entry_namespace == namespace:
+                keys.append(key)
+                matrix.append(entry_vector)
+        if not keys:
+            return None
+        scores = np.stack(matrix) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        return self._entries.peek(keys[best])
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        messages: List[Dict[str, str]],
+        compute: Callable[[], Awaitable[str]],
+        semantic: bool = False,
+        should_store: Callable[[str], bool] = lambda response: True,
+    ) -> str:
+        """
+        Devolve a resposta em cache para o prompt ou a calcula com `compute`.
+        Chamadas simultâneas com o mesmo prompt aguardam a mesma geração.
+        """
+        prompt = self.prompt_text(messages)
+        key = self.key(namespace, prompt)
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            return cached
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        vector = None
+        try:
+            if semantic:
+                vector = await self._embed(prompt)
+                similar = (
+                    self._semantic_lookup(namespace, vector)
+                    if vector is not None
+                    else None
+                )
+                if similar is not None:
+                    self.semantic_hits += 1
+                    future.set_result(similar)
+                    return similar
+            response = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita o aviso de exceção não lida quando ninguém mais aguardava.
+            future.exception()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+        future.set_result(response)
+        if should_store(response):
+            self._entries.set(key, response)
+            if vector is not None:
+                self._vectors[key] = (namespace, vector)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._entries.stats()
+        lookups = stats["hits"] + stats["misses"]
+        # Acertos semânticos e chamadas agrupadas contam como falta na camada exata.
+        reused = stats["hits"] + self.semantic_hits + self.coalesced
+        return {
+            **stats,
+            "semantic_hits": self.semantic_hits,
+            "coalesced": self.coalesced,
+            "vectors": len(self._vectors),
+            "hit_rate": reused / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.log_util import log_exception
+from app.utils.ttl_cache import TTLCache
+
+SuggestionKey = Tuple[str, str, int]
+GenerateFunc = Callable[[str, List[str]], Awaitable[List[str]]]
+
+
+class SpeculativeSuggestions:
+    """
+    Sugestões de ação calculadas de forma especulativa logo após o turno do
+    narrador, guardadas por (personagem, batalha, índice do turno) para que o
+    endpoint HTTP de sugestões responda sem uma nova chamada à LLM.
+    """
+
+    def __init__(self, generate: GenerateFunc, max_entries: int, ttl: float):
+        self.generate = generate
+        self._tasks = TTLCache(max_entries, ttl)
+        self.speculated = 0
+
+    def schedule(
+        self,
+        character_id: str,
+        battle_id: str,
+        turn_index: int,
+        battle_theme: str,
+        history: List[str],
+    ) -> asyncio.Task:
+        """Dispara a geração em segundo plano e guarda a tarefa no cache."""
+        key = (character_id, battle_id, turn_index)
+        task = self._tasks.peek(key)
+        if task is None:
+            task = asyncio.create_task(self.generate(battle_theme, history))
+            self._tasks.set(key, task)
+            self.speculated += 1
+        return task
+
+    async def get(
+        self, character_id: str, battle_id: str, turn_index: int
+    ) -> Optional[List[str]]:
+        """Aguarda a sugestão especulativa do turno, se ela existir."""
+        task = self._tasks.get((character_id, battle_id, turn_index))
+        if task is None:
+            return None
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            log_exception()
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._tasks.stats(), "speculated": self.speculated}
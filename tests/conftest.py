@@ -0,0 +1,5 @@
+import os
+
+# As configurações exigem estas variáveis; os testes não acessam o MongoDB.
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("MONGODB_URL", "mongodb://localhost:27017")
@@ -0,0 +1,113 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.response_cache import ResponseCache
+from app.utils import ttl_cache
+from app.utils.ttl_cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(max_entries=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    clock[0] = 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert "b" not in cache
+    clock[0] = 5
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.evictions == 1
+
+
+def messages(text):
+    return [{"role": "user", "content": text}]
+
+
+@pytest.mark.asyncio
+async def test_response_cache_exact_hits_ignore_whitespace_and_case():
+    cache = ResponseCache(max_entries=10, ttl=60, semantic_threshold=0.9)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "resposta"
+
+    assert await cache.get_or_compute("ns", messages("Olá  mundo"), compute) == (
+        "resposta"
+    )
+    assert await cache.get_or_compute("ns", messages("olá mundo"), compute) == (
+        "resposta"
+    )
+    await cache.get_or_compute("outro", messages("olá mundo"), compute)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_response_cache_coalesces_concurrent_calls():
+    cache = ResponseCache(max_entries=10, ttl=60, semantic_threshold=0.9)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "resposta"
+
+    results = await asyncio.gather(
+        *(cache.get_or_compute("ns", messages("x"), compute) for _ in range(5))
+    )
+    assert results == ["resposta"] * 5
+    assert len(calls) == 1 and cache.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_response_cache_skips_rejected_responses():
+    cache = ResponseCache(max_entries=10, ttl=60, semantic_threshold=0.9)
+
+    async def compute():
+        return "falhou"
+
+    for _ in range(2):
+        await cache.get_or_compute(
+            "ns", messages("x"), compute, should_store=lambda r: r != "falhou"
+        )
+    assert cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_response_cache_semantic_tier_is_opt_in():
+    async def embed(texts):
+        return np.ones((len(texts), 3))
+
+    cache = ResponseCache(max_entries=10, ttl=60, semantic_threshold=0.9, embed=embed)
+    answers = iter(["primeira", "segunda", "terceira"])
+
+    async def compute():
+        return next(answers)
+
+    await cache.get_or_compute("ns", messages("a"), compute, semantic=True)
+    # Sem `semantic`, um prompt diferente nunca reaproveita a resposta.
+    assert await cache.get_or_compute("ns", messages("b"), compute) == "segunda"
+    assert (
+        await cache.get_or_compute("ns", messages("c"), compute, semantic=True)
+        == "primeira"
+    )
+    assert cache.semantic_hits == 1
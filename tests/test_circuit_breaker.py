@@ -0,0 +1,85 @@
+import pytest
+
+from app.core import circuit_breaker
+from app.core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    ProviderError,
+    parse_retry_after,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_and_recovers(clock):
+    breaker = CircuitBreaker("p", failure_threshold=2, cooldown=10)
+    breaker.record_failure("x")
+    assert breaker.state == CLOSED
+    breaker.record_failure("x")
+    assert breaker.state == OPEN and not breaker.available()
+
+    clock[0] += 10
+    assert breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.acquire()  # uma sonda por vez
+
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 0
+
+
+def test_failed_probe_doubles_cooldown(clock):
+    breaker = CircuitBreaker("p", failure_threshold=1, cooldown=10, max_cooldown=15)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.acquire()
+    breaker.record_failure()
+    assert breaker.current_cooldown == 15
+    clock[0] += 14
+    assert not breaker.available()
+    clock[0] += 1
+    assert breaker.available()
+
+
+def test_release_frees_the_probe(clock):
+    breaker = CircuitBreaker("p", failure_threshold=1, cooldown=1)
+    breaker.record_failure()
+    clock[0] += 1
+    assert breaker.acquire()
+    breaker.release()
+    assert breaker.acquire()
+
+
+def test_retry_after_opens_immediately(clock):
+    breaker = CircuitBreaker("p", failure_threshold=5)
+    breaker.record_failure("429", retry_after=42)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["retry_in"] == 42
+
+
+@pytest.mark.parametrize(
+    "status, trips",
+    [(None, True), (429, True), (500, True), (503, True), (400, False), (404, False)],
+)
+def test_only_overload_server_and_transport_errors_trip(status, trips):
+    assert ProviderError("p", "x", status=status).trips_breaker is trips
+
+
+def test_auth_failures():
+    assert ProviderError("p", "x", status=401).auth_failed
+    assert ProviderError("p", "x", status=403).auth_failed
+    assert not ProviderError("p", "x", status=400).auth_failed
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("amanhã") is None
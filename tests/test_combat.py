@@ -0,0 +1,68 @@
+import numpy as np
+
+from app.core import combat
+
+ATTRIBUTES = {"strength": 7, "dexterity": 10}
+
+
+def outcome(turn: int, secret: str = "s", action: str = "atacar"):
+    rng = combat.round_rng("personagem", "batalha", turn, secret)
+    return combat.resolve_round(ATTRIBUTES, action, rng)
+
+
+def test_same_round_same_outcome():
+    assert outcome(4) == outcome(4)
+
+
+def test_secret_and_turn_change_the_stream():
+    def draws(turn, secret):
+        return combat.round_rng("personagem", "batalha", turn, secret).integers(
+            0, 2**62, size=4
+        )
+
+    assert not np.array_equal(draws(4, "s"), draws(4, "outro"))
+    assert not np.array_equal(draws(4, "s"), draws(6, "s"))
+    assert combat.battle_seed("c", "b", "s") != combat.battle_seed("c", "b", "t")
+
+
+def test_battle_without_id_is_not_seeded():
+    first = combat.round_rng("c", None, 0, "s").integers(0, 2**62, size=4)
+    second = combat.round_rng("c", None, 0, "s").integers(0, 2**62, size=4)
+    assert not np.array_equal(first, second)
+
+
+def test_damage_ranges_and_dodges_zero_damage():
+    batch = combat.resolve_rounds(7, 10, False, np.random.default_rng(1), size=5000)
+    hit = ~batch.enemy_dodged
+    assert (batch.player_damage[~hit] == 0).all()
+    assert (batch.player_damage[hit] >= 7 * 5).all()
+    assert (batch.player_damage[hit] <= 7 * 10).all()
+    assert (batch.player_damage[hit] % 7 == 0).all()
+
+    taken = ~batch.player_dodged
+    assert (batch.enemy_damage[~taken] == 0).all()
+    assert ((batch.enemy_damage[taken] >= 10) & (batch.enemy_damage[taken] <= 20)).all()
+    # Destreza 10: 20% de esquiva do jogador; o inimigo esquiva 10%
+    assert 0.17 < batch.player_dodged.mean() < 0.23
+    assert 0.08 < batch.enemy_dodged.mean() < 0.12
+
+
+def test_full_dexterity_always_dodges():
+    batch = combat.resolve_rounds(7, 50, False, np.random.default_rng(2), size=1000)
+    assert batch.player_dodged.all()
+    assert (batch.enemy_damage == 0).all()
+
+
+def test_special_action_doubles_player_damage():
+    normal = combat.resolve_rounds(7, 10, False, np.random.default_rng(3), size=1000)
+    special = combat.resolve_rounds(7, 10, True, np.random.default_rng(3), size=1000)
+    assert special.special.all()
+    assert np.array_equal(special.player_damage, normal.player_damage * 2)
+    assert np.array_equal(special.enemy_damage, normal.enemy_damage)
+
+
+def test_special_keywords():
+    assert combat.is_special_action("Usar HABILIDADE de fogo")
+    assert combat.is_special_action("ataque especial")
+    assert not combat.is_special_action("atacar")
+    assert outcome(2, action="ataque especial").special
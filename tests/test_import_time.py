@@ -0,0 +1,96 @@
+"""
+Orçamento de importação da API: `import app.main` precisa continuar rápido e
+não pode carregar os componentes pesados de IA, que ficam para o lifespan.
+As rotas de autenticação, usuários e personagens têm um orçamento próprio,
+bem abaixo de um segundo, sem contar o FastAPI, o pydantic e o motor.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Medido em ~1.2s a frio, quase tudo do próprio FastAPI; a folga cobre CI lento.
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "2.5"))
+HEAVY_MODULES = ("model2vec", "sentence_transformers", "chromadb")
+
+# Só o código da aplicação; o FastAPI sozinho leva ~1s a frio e fica de fora.
+ROUTER_IMPORT_BUDGET_SECONDS = float(
+    os.environ.get("ROUTER_IMPORT_BUDGET_SECONDS", "0.5")
+)
+ROUTER_MODULES = (
+    "app.api.v1.endpoints.auth",
+    "app.api.v1.endpoints.users",
+    "app.api.v1.endpoints.characters",
+)
+# Nada de LLM, memória vetorial ou numpy no caminho do login
+ROUTER_FORBIDDEN_MODULES = HEAVY_MODULES + (
+    "numpy",
+    "app.services.llm_service",
+    "app.core.free_llms",
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+ROUTER_PROBE = f"""
+import json, sys, time
+import fastapi, fastapi.security, pydantic, motor.motor_asyncio
+started = time.perf_counter()
+for module in {ROUTER_MODULES!r}:
+    __import__(module)
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {ROUTER_FORBIDDEN_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_probe(code: str) -> dict:
+    env = {
+        **os.environ,
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "test"),
+        "MONGODB_URL": os.environ.get("MONGODB_URL", "mongodb://localhost:27017"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_app_main_within_budget():
+    probe = run_probe(PROBE)
+
+    assert probe["loaded"] == [], f"Importados cedo demais: {probe['loaded']}"
+    assert probe["elapsed"] < IMPORT_BUDGET_SECONDS, (
+        f"import app.main levou {probe['elapsed']:.2f}s "
+        f"(orçamento: {IMPORT_BUDGET_SECONDS}s)"
+    )
+
+
+def test_import_account_routers_within_budget():
+    probe = run_probe(ROUTER_PROBE)
+
+    assert probe["loaded"] == [], f"Importados pelas rotas: {probe['loaded']}"
+    assert probe["elapsed"] < ROUTER_IMPORT_BUDGET_SECONDS, (
+        f"rotas de auth/usuários/personagens levaram {probe['elapsed']:.2f}s "
+        f"(orçamento: {ROUTER_IMPORT_BUDGET_SECONDS}s)"
+    )
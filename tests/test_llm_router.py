@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from app.core.circuit_breaker import ProviderError, ProviderNotConfiguredError
+from app.core.llm_router import LLMRouter, ProviderStats
+
+
+def provider(name, calls, response=None, error=None, delay=0.0):
+    async def call(messages):
+        calls.append(name)
+        if delay:
+            await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return response
+
+    return call
+
+
+def test_score_prefers_fast_reliable_providers():
+    unused, fast, slow, broken = (ProviderStats(alpha=0.5) for _ in range(4))
+    fast.record(0.1, True)
+    slow.record(1.0, True)
+    broken.record(0.1, False)
+    assert unused.score() == 0.0
+    assert fast.score() < slow.score() < broken.score()
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_the_next_provider():
+    calls = []
+    router = LLMRouter(
+        [
+            ("a", provider("a", calls, error=ProviderError("a", "x", status=500))),
+            ("b", provider("b", calls, response="ok")),
+        ],
+        hedging=False,
+    )
+    assert await router.route([]) == ("b", "ok")
+    assert calls == ["a", "b"]
+    assert router.idle()
+
+
+@pytest.mark.asyncio
+async def test_request_errors_push_the_provider_down():
+    calls = []
+    router = LLMRouter(
+        [
+            ("a", provider("a", calls, error=ProviderError("a", "x", status=400))),
+            ("b", provider("b", calls, response="ok")),
+        ],
+        hedging=False,
+    )
+    for _ in range(3):
+        await router.route([])
+    # O 400 não abre o disjuntor, mas o provedor vai para o fim da fila.
+    assert calls == ["a", "b", "b", "b"]
+    assert router.breakers["a"].available()
+    assert router.stats["a"].failures == 1
+
+
+@pytest.mark.asyncio
+async def test_rejected_key_and_missing_config_are_benched():
+    calls = []
+    router = LLMRouter(
+        [
+            ("a", provider("a", calls, error=ProviderError("a", "x", status=401))),
+            ("b", provider("b", calls, error=ProviderNotConfiguredError("b", "x"))),
+            ("c", provider("c", calls, response="ok")),
+        ],
+        hedging=False,
+    )
+    await router.route([])
+    await router.route([])
+    assert calls == ["a", "b", "c", "c"]
+    assert not router.breakers["a"].available()
+    assert not router.breakers["b"].available()
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_over_a_slow_provider():
+    calls = []
+    router = LLMRouter(
+        [
+            ("slow", provider("slow", calls, response="lento", delay=1.0)),
+            ("fast", provider("fast", calls, response="rápido")),
+        ],
+        hedge_min_delay=0.01,
+        hedge_max_delay=0.01,
+    )
+    assert await router.route([]) == ("fast", "rápido")
+    assert router.hedges_fired == 1 and router.hedges_won == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_switches_provider_before_the_first_token():
+    async def failing(messages):
+        raise ProviderError("a", "x", status=503)
+        yield  # pragma: no cover
+
+    async def working(messages):
+        for token in ("era ", "uma ", "vez"):
+            yield token
+
+    router = LLMRouter(
+        [("a", provider("a", [])), ("b", provider("b", []))],
+        stream_providers={"a": failing, "b": working},
+    )
+    tokens = [token async for token in router.stream([])]
+    assert "".join(tokens) == "era uma vez"
+    assert router.stats["a"].failures == 1
+    assert router.stats["b"].samples == 1
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.services import llm_service
+from app.services.memory_index import HotMemoryIndex
+
+
+class FakeExecutor:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def run(self, func, batch):
+        if self.fail:
+            raise RuntimeError("chroma fora do ar")
+        self.batches.append([entry[1] for entry in batch])
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    fake = FakeExecutor()
+    monkeypatch.setattr(llm_service, "get_inference_executor", lambda: fake)
+    return fake
+
+
+def buffer(max_batch=2, max_pending=10):
+    return llm_service.InteractionBuffer(
+        flush_interval=60, max_batch=max_batch, max_pending=max_pending
+    )
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_in_batches(executor):
+    interactions = buffer()
+    for character_id in "abc":
+        interactions.add(character_id, "texto", {})
+    await interactions.close()
+    assert executor.batches == [["a", "b"], ["c"]]
+
+
+@pytest.mark.asyncio
+async def test_flush_character_writes_only_that_character(executor):
+    interactions = buffer(max_batch=10)
+    for character_id in "abac":
+        interactions.add(character_id, "texto", {})
+    await interactions.flush_character("a")
+    assert executor.batches == [["a", "a"]]
+    assert not interactions.has_pending("a") and interactions.has_pending("b")
+    await interactions.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_requeued_and_queue_is_bounded(executor):
+    executor.fail = True
+    interactions = buffer(max_batch=2, max_pending=3)
+    for i in range(5):
+        interactions.add(f"c{i}", "texto", {})
+    assert interactions.stats()["dropped"] == 2
+    with pytest.raises(RuntimeError):
+        await interactions.flush()
+    assert [entry[1] for entry in interactions._pending] == ["c2", "c3", "c4"]
+
+    executor.fail = False
+    await interactions.close()
+    assert executor.batches == [["c2", "c3"], ["c4"]]
+
+
+@pytest.mark.asyncio
+async def test_discard_battle_drops_its_pending_entries(executor):
+    interactions = buffer(max_batch=10)
+    interactions.add("a", "1", {"battle_id": "b1"})
+    interactions.add("a", "2", {"battle_id": "b2"})
+    interactions.add("c", "3", {"battle_id": "b1"})
+    interactions.discard_battle("a", "b1")
+    await interactions.close()
+    assert executor.batches == [["a", "c"]]
+
+
+def test_hot_memory_search_and_limits():
+    index = HotMemoryIndex(max_characters=2, max_vectors=3, idle_ttl=60)
+    assert index.search("a", [1, 0], 1) is None
+
+    assert index.begin_load("a")
+    index.append("a", ["1"], ["durante a carga"], [[0, 1]])
+    index.finish_load("a", ["2"], ["norte"], [[1, 0]])
+    assert index.search("a", [1, 0.1], 1) == ["norte"]
+    assert index.search("a", [0, 1], 2) == ["durante a carga", "norte"]
+
+    # Ids repetidos são ignorados; passar de max_vectors tira o personagem.
+    index.append("a", ["2"], ["norte"], [[1, 0]])
+    assert index.stats()["vectors"] == 2
+    index.append("a", ["3", "4"], ["x", "y"], np.eye(2))
+    assert not index.is_hot("a")